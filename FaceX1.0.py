@@ -1,7 +1,6 @@
+import os
 import sys
 import cv2
-import numpy as np
-import insightface
 from insightface.app import FaceAnalysis
 from insightface.model_zoo import get_model
 import time
@@ -10,15 +9,26 @@ from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton, QVBo
 from PyQt5.QtGui import QImage, QPixmap, QIcon
 from PyQt5.QtCore import QTimer, Qt, QSize
 from PyQt5.QtWidgets import QLineEdit  # 添加到现有的imports中
-import requests  # 用于API调用
-import json  # 用于处理API响应
-import os  # 用于文件操作
-
-
-def init_face_analyzer(det_size=(640, 640)):
-    # 初始化人脸检测器，使用 GPU
-    analyzer = FaceAnalysis(name='buffalo_l', providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
-    analyzer.prepare(ctx_id=0, det_size=det_size)
+from facex_stream import StreamPipeline
+from facex_source import open_source
+from facex_record import VideoRecorder
+from facex_display import FrameView
+from facex_profiler import StageProfiler
+from facex_cache import FaceCache
+from facex_core import ProfiledAnalyzer
+from facex_runtime import RuntimeConfig, report_sessions
+from facex_log import get_logger, setup_logging
+
+log = get_logger('app')
+
+
+def init_face_analyzer(det_size=(640, 640), config=None):
+    # 初始化人脸检测器，执行提供者和会话参数由 RuntimeConfig 决定（默认优先 GPU）
+    config = config or RuntimeConfig()
+    providers = config.resolve_providers()
+    analyzer = FaceAnalysis(name='buffalo_l', providers=providers)
+    analyzer.prepare(ctx_id=config.ctx_id(providers), det_size=det_size)
+    config.apply(analyzer.models.values(), providers)
     return analyzer
 
 
@@ -33,20 +43,10 @@ def load_source_face(img_path, analyzer):
     return faces[0]
 
 
-def setup_camera(resolution=(320, 240), fps=30):
-    # 初始化摄像头捕获，并设置分辨率和帧率
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
-    cap.set(cv2.CAP_PROP_FPS, fps)
-    if not cap.isOpened():
-        raise IOError("无法打开摄像头")
-    return cap
-
-
-def swap_faces_in_frame(frame, analyzer, swapper, source_face):
-    # 在帧中进行人脸替换
-    target_faces = analyzer.get(frame)
+def swap_faces_in_frame(frame, analyzer, swapper, source_face, target_faces=None):
+    # 在帧中进行人脸替换，已有检测结果时直接复用，避免重复检测
+    if target_faces is None:
+        target_faces = analyzer.get(frame)
     if target_faces:
         target_face = target_faces[0]
         # 使用 GPU 进行人脸替换
@@ -61,24 +61,47 @@ class FaceSwapApp(QMainWindow):
         self.setWindowTitle("实时换脸应用")
         self.setGeometry(100, 100, 1200, 800)  # 初始窗口大小
 
-        # 初始化 InsightFace 组件
-        self.face_analyzer = init_face_analyzer()
-        self.face_swapper = get_model('inswapper_128.onnx', download=False,
-                                      providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
+        # 初始化 InsightFace 组件，执行提供者和线程等参数可通过 FACEX_* 环境变量配置
+        self.runtime_config = RuntimeConfig.from_env()
+        log.info("ONNX Runtime 配置: %s", self.runtime_config.describe())
+        self.face_analyzer = init_face_analyzer(config=self.runtime_config)
+        providers = self.runtime_config.resolve_providers()
+        self.face_swapper = get_model('inswapper_128.onnx', download=False, providers=providers)
+        self.runtime_config.apply([self.face_swapper], providers)
+        report_sessions(dict(self.face_analyzer.models, swapper=self.face_swapper))
+
+        # 实时画面只运行检测模型，识别模型只用于源人脸
+        self.target_analyzer = ProfiledAnalyzer(self.face_analyzer, 'detection')
+
+        # 源人脸缓存：按图像内容哈希保存检测结果，切换预设图像时无需重新检测
+        # 模型变体会改变检测结果，缓存按变体区分
+        variant = self.runtime_config.variant
+        self.face_cache = FaceCache(tag='buffalo_l' if variant == 'fp32' else f'buffalo_l_{variant}')
+
+        # 各阶段耗时统计（采集、检测、换脸、美颜、录制、显示、端到端延迟），可叠加显示在画面上
+        self.profiler = StageProfiler()
+        self.hud_enabled = False
 
         # 源图像路径和人脸
         self.source_face = None
 
-        # 摄像头初始化
-        self.cap = setup_camera(resolution=(640, 480), fps=30)
+        # 视频源初始化（默认摄像头，FACEX_SOURCE 可改为视频文件、图像目录、RTSP 地址或合成画面）
+        self.cap = open_source(resolution=(640, 480), fps=30)
 
         # 是否开启换脸
         self.is_swapping = False
 
         # 录制视频相关变量
-        self.recording = False
-        self.out = None
+        self.recorder = None  # 录制中为 VideoRecorder，编码在其自己的线程中进行
         self.record_start_time = None
+        self.saving_recorder = None  # 已停止录制、剩余的帧仍在写入的 VideoRecorder
+        self.close_pending = False  # 关闭窗口时录制还没写完，写完后再关闭
+        self.save_timer = QTimer(self)
+        self.save_timer.timeout.connect(self.check_recording_saved)
+
+        # 当前显示的帧（截图使用）
+        self.current_frame = None
+        self.display_count = 0
 
         # 预设的四张图片路径
         self.preset_images = [
@@ -91,10 +114,15 @@ class FaceSwapApp(QMainWindow):
         # 创建 GUI 元素
         self.init_ui()
 
-        # 定时器更新视频流
+        # 采集/推理/录制在后台线程运行，GUI 线程只负责显示
+        self.stream = StreamPipeline(self.cap, self.process_frame, profiler=self.profiler)
+        self.stream.add_sink(self.record_frame)
+        self.stream.start()
+
+        # 定时器刷新显示，只取最新的处理结果，不会阻塞
         self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_frame)
-        self.timer.start(33)  # 每 33 毫秒更新一次
+        self.timer.timeout.connect(self.render_frame)
+        self.timer.start(15)
 
         # 添加预设图片到列表
         self.init_preset_images()
@@ -140,8 +168,8 @@ class FaceSwapApp(QMainWindow):
 
         # 左侧：视频显示区域
         video_layout = QVBoxLayout()
-        self.video_label = QLabel(self)
-        self.video_label.setAlignment(Qt.AlignCenter)
+        # 直接包装 BGR 帧缓冲区绘制，不经过 QPixmap 和预缩放
+        self.video_label = FrameView(self, smooth=True, profiler=self.profiler)
         self.video_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.video_label.setStyleSheet("background-color: #2c2c30; border-radius: 15px; padding: 10px;")
         self.video_label.setMinimumSize(640, 480)  # 设置最小尺寸
@@ -172,6 +200,12 @@ class FaceSwapApp(QMainWindow):
         self.record_button.clicked.connect(self.toggle_recording)
         bottom_layout.addWidget(self.record_button)
 
+        # 性能叠加显示按钮：各阶段耗时的 p50/p95/p99
+        self.hud_button = QPushButton("📊 性能", self)
+        self.hud_button.setCheckable(True)
+        self.hud_button.toggled.connect(self.toggle_hud)
+        bottom_layout.addWidget(self.hud_button)
+
         video_layout.addLayout(bottom_layout)
         main_layout.addLayout(video_layout)
 
@@ -312,41 +346,13 @@ class FaceSwapApp(QMainWindow):
         main_layout.setStretch(2, 1)  # 控制面板
 
     def toggle_recording(self):
-        if self.recording:
-            self.recording = False
-            self.record_button.setText("🔴 开始录制")
-            self.record_time_label.hide()
-            self.out.release()
-            if hasattr(self, 'record_timer'):
-                self.record_timer.stop()
-            msg_box = QMessageBox(self)
-            msg_box.setWindowTitle("录制完成")
-            msg_box.setText(f"视频已保存为: {self.current_video_path}")
-            msg_box.setStyleSheet("""
-                QMessageBox {
-                    background-color: #323236;
-                }
-                QMessageBox QLabel {
-                    color: #ffffff;
-                }
-                QPushButton {
-                    background-color: #0a84ff;
-                    border: none;
-                    border-radius: 5px;
-                    color: #ffffff;
-                    padding: 5px 15px;
-                }
-                QPushButton:hover {
-                    background-color: #40a9ff;
-                }
-            """)
-            msg_box.exec_()
+        if self.recorder is not None:
+            self.stop_recording()
         else:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             timestamp = int(time.time())
             self.current_video_path = f"recording_{timestamp}.mp4"
-            self.out = cv2.VideoWriter(self.current_video_path, fourcc, 30.0, (640, 480))
-            self.recording = True
+            # 按处理结果的原始分辨率和实际帧率录制，编码参数见 FACEX_RECORD_* 环境变量
+            self.recorder = VideoRecorder.from_env(self.current_video_path, profiler=self.profiler)
             self.record_button.setText("⏹️ 停止录制")
             self.record_time_label.show()
             self.record_start_time = time.time()
@@ -354,6 +360,63 @@ class FaceSwapApp(QMainWindow):
             self.record_timer.timeout.connect(self.update_record_time)
             self.record_timer.start(1000)  # 更新录制时间每秒一次
 
+    def stop_recording(self):
+        # 停止接收新帧后立即返回，剩余的帧在录制线程中写完，由 check_recording_saved 轮询后提示
+        recorder, self.recorder = self.recorder, None
+        recorder.stop()
+        self.saving_recorder = recorder
+        self.record_button.setText("💾 正在保存")
+        self.record_button.setEnabled(False)
+        self.record_time_label.hide()
+        if hasattr(self, 'record_timer'):
+            self.record_timer.stop()
+        self.save_timer.start(100)
+
+    def check_recording_saved(self):
+        recorder = self.saving_recorder
+        if recorder is None or not recorder.finished():
+            return
+        self.save_timer.stop()
+        self.saving_recorder = None
+        self.record_button.setText("🔴 开始录制")
+        self.record_button.setEnabled(True)
+        saved = recorder.succeeded()
+        stats = recorder.stats()
+        if self.close_pending:
+            # 窗口在等待录制写完后关闭，不再弹出提示
+            if saved:
+                log.info("视频已保存为: %s", self.current_video_path)
+            else:
+                log.warning("录制失败: %s", recorder.error or '没有写入任何帧')
+            self.close()
+            return
+        msg_box = QMessageBox(self)
+        msg_box.setWindowTitle("录制完成")
+        if saved:
+            msg_box.setText(f"视频已保存为: {self.current_video_path}\n"
+                            f"{stats['written']} 帧 @ {stats['fps']} fps，丢弃 {stats['dropped']} 帧")
+        else:
+            msg_box.setText(f"录制失败: {recorder.error or '没有写入任何帧'}")
+        msg_box.setStyleSheet("""
+            QMessageBox {
+                background-color: #323236;
+            }
+            QMessageBox QLabel {
+                color: #ffffff;
+            }
+            QPushButton {
+                background-color: #0a84ff;
+                border: none;
+                border-radius: 5px;
+                color: #ffffff;
+                padding: 5px 15px;
+            }
+            QPushButton:hover {
+                background-color: #40a9ff;
+            }
+        """)
+        msg_box.exec_()
+
     def update_record_time(self):
         elapsed_time = int(time.time() - self.record_start_time)
         minutes = elapsed_time // 60
@@ -361,13 +424,9 @@ class FaceSwapApp(QMainWindow):
         self.record_time_label.setText(f"录制时间: {minutes:02}:{seconds:02}")
 
     def take_screenshot(self):
-        # 获取当前视频帧
-        ret, frame = self.cap.read()
-        if ret:
-            # 如果开启换脸且有源图像，则执行换脸
-            if self.is_swapping and self.source_face is not None:
-                frame = swap_faces_in_frame(frame, self.face_analyzer, self.face_swapper, self.source_face)
-
+        # 保存当前显示的帧（已包含换脸效果）
+        frame = self.current_frame
+        if frame is not None:
             timestamp = int(time.time())
             screenshot_path = f"screenshot_{timestamp}.png"
             cv2.imwrite(screenshot_path, frame)
@@ -400,7 +459,7 @@ class FaceSwapApp(QMainWindow):
         if file_path:
             try:
                 # 加载源图像并提取人脸
-                self.source_face = load_source_face(file_path, self.face_analyzer)
+                self.source_face = self.face_cache.load(file_path, self.face_analyzer)
 
                 # 显示源图像
                 source_img = cv2.imread(file_path)
@@ -412,14 +471,14 @@ class FaceSwapApp(QMainWindow):
                 scaled_pixmap = pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
                 self.image_label.setPixmap(scaled_pixmap)
 
-                print(f"成功加载源图像: {file_path}")
+                log.info("成功加载源图像: %s", file_path)
             except Exception as e:
-                print(f"加载源图像失败: {str(e)}")
+                log.warning("加载源图像失败: %s", e)
 
     def toggle_face_swap(self, value):
         if value == 0:  # 滑块在左边
             self.is_swapping = False
-            print("换脸状态: 关闭")
+            log.info("换脸状态: 关闭")
         else:  # 滑块在右边
             if self.source_face is None:
                 msg_box = QMessageBox(self)
@@ -447,12 +506,12 @@ class FaceSwapApp(QMainWindow):
                 self.face_swap_switch.setValue(0)  # 将滑块重置到左边
                 return
             self.is_swapping = True
-            print("换脸状态: 开启")
+            log.info("换脸状态: 开启")
 
     def select_preset_image(self, index):
         if index < len(self.preset_images):
             try:
-                self.source_face = load_source_face(self.preset_images[index], self.face_analyzer)
+                self.source_face = self.face_cache.load(self.preset_images[index], self.face_analyzer)
 
                 # 显示源图像
                 source_img = cv2.imread(self.preset_images[index])
@@ -464,9 +523,9 @@ class FaceSwapApp(QMainWindow):
                 scaled_pixmap = pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
                 self.image_label.setPixmap(scaled_pixmap)
 
-                print(f"选择了预设图像: {self.preset_images[index]}")
+                log.info("选择了预设图像: %s", self.preset_images[index])
             except Exception as e:
-                print(f"选择预设图像失败: {str(e)}")
+                log.warning("选择预设图像失败: %s", e)
 
     def replace_preset_image(self, index):
         if index < len(self.preset_images):
@@ -474,7 +533,7 @@ class FaceSwapApp(QMainWindow):
             if file_path:
                 try:
                     # 加载新图像并提取人脸
-                    new_face = load_source_face(file_path, self.face_analyzer)
+                    new_face = self.face_cache.load(file_path, self.face_analyzer)
 
                     # 更新预设图像路径
                     self.preset_images[index] = file_path
@@ -488,9 +547,9 @@ class FaceSwapApp(QMainWindow):
                     icon = QIcon(QPixmap.fromImage(q_img).scaled(140, 140, Qt.KeepAspectRatio, Qt.SmoothTransformation))
                     self.image_buttons[index].setIcon(icon)
 
-                    print(f"替换了预设图像: {file_path}")
+                    log.info("替换了预设图像: %s", file_path)
                 except Exception as e:
-                    print(f"替换预设图像失败: {str(e)}")
+                    log.warning("替换预设图像失败: %s", e)
 
     def init_preset_images(self):
         for i, img_path in enumerate(self.preset_images):
@@ -505,50 +564,86 @@ class FaceSwapApp(QMainWindow):
                 icon = QIcon(QPixmap.fromImage(q_img).scaled(140, 140, Qt.KeepAspectRatio, Qt.SmoothTransformation))
                 self.image_buttons[i].setIcon(icon)
             except Exception as e:
-                print(f"加载预设图像失败: {str(e)}")
-
-    def update_frame(self):
-        # 读取摄像头帧
-        ret, frame = self.cap.read()
-        if ret:
-            # 缩小图像尺寸以提高性能
-            frame = cv2.resize(frame, (640, 480))
-
-            # 如果开启换脸且有源图像，则执行换脸
-            if self.is_swapping and self.source_face is not None:
-                frame = swap_faces_in_frame(frame, self.face_analyzer, self.face_swapper, self.source_face)
-
-            # 录制视频时使用BGR格式
-            if self.recording:
-                self.out.write(frame)  # 直接写入frame，因为原始frame就是BGR格式
-
-            # 显示时转换为RGB格式
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = frame_rgb.shape
-            bytes_per_line = ch * w
-            q_img = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_img)
-            scaled_pixmap = pixmap.scaled(self.video_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.video_label.setPixmap(scaled_pixmap)
-
-            # 显示 FPS
-            current_time = time.time()
-            if hasattr(self, 'last_time') and current_time - self.last_time > 1.0:
-                self.fps = getattr(self, 'frame_count', 0)
-                self.frame_count = 0
-                self.last_time = current_time
-            self.frame_count = getattr(self, 'frame_count', 0) + 1
-            self.fps_label.setText(f"FPS: {getattr(self, 'fps', 0)}")
+                log.warning("加载预设图像失败: %s", e)
+
+    def process_frame(self, frame):
+        """推理线程中处理一帧"""
+        # 缩小图像尺寸以提高性能
+        frame = cv2.resize(frame, (640, 480))
+
+        # 如果开启换脸且有源图像，则执行换脸
+        if self.is_swapping and self.source_face is not None:
+            with self.profiler.stage('detect'):
+                faces = self.target_analyzer.get(frame)
+            with self.profiler.stage('swap'):
+                frame = swap_faces_in_frame(frame, self.target_analyzer, self.face_swapper, self.source_face,
+                                            target_faces=faces)
+        return frame
+
+    def record_frame(self, packet):
+        """推理线程中把处理结果交给录制队列（非阻塞），按采集时间戳写入"""
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(packet.output, packet.timestamp)
+
+    def render_frame(self):
+        """GUI 线程中显示最新的处理结果"""
+        packet = self.stream.latest()
+        if packet is None:
+            return
+        frame = packet.output
+        self.profiler.add('latency', (time.time() - packet.timestamp) * 1000)
+        self.current_frame = frame
+
+        # 直接显示 BGR 帧，缩放在绘制时完成
+        self.video_label.set_frame(frame)
+
+        # 显示 FPS
+        current_time = time.time()
+        if not hasattr(self, 'last_time'):
+            self.last_time = current_time
+        if current_time - self.last_time > 1.0:
+            self.fps = self.display_count
+            self.display_count = 0
+            self.last_time = current_time
+            if self.hud_enabled:
+                self.video_label.set_hud(self.profiler.hud_lines())
+        self.display_count += 1
+        self.fps_label.setText(f"FPS: {getattr(self, 'fps', 0)}")
+
+    def toggle_hud(self, checked):
+        self.hud_enabled = checked
+        self.video_label.set_hud(self.profiler.hud_lines() if checked else None)
+
+    def export_profile(self):
+        # 设置 FACEX_PROFILE_EXPORT=路径.csv/.json 时退出前导出各阶段耗时统计
+        path = os.environ.get('FACEX_PROFILE_EXPORT')
+        if path:
+            try:
+                self.profiler.export(path)
+            except Exception as e:
+                log.warning("导出性能统计失败: %s", e)
 
     def closeEvent(self, event):
-        # 释放资源
+        # 先停止后台线程，再释放资源
+        self.timer.stop()
+        self.stream.stop()
         self.cap.release()
-        if self.out is not None:
-            self.out.release()
+        if self.recorder is not None:
+            self.stop_recording()
+        if self.saving_recorder is not None:
+            # 不在界面线程中等待录制写完：先隐藏窗口，check_recording_saved 写完后再次调用 close()
+            self.close_pending = True
+            self.hide()
+            event.ignore()
+            return
+        self.export_profile()
         event.accept()
 
 
 if __name__ == "__main__":
+    # 日志级别、格式和异步输出见 FACEX_LOG_* 环境变量，默认 INFO
+    setup_logging()
     app = QApplication(sys.argv)
     window = FaceSwapApp()
     window.show()
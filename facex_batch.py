@@ -0,0 +1,405 @@
+import argparse
+import copy
+import itertools
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from facex_core import init_face_analyzer, init_face_swapper, load_source_face, swap_faces_in_frame, \
+    ProfiledAnalyzer
+from facex_runtime import RuntimeConfig, add_runtime_arguments, report_sessions
+from facex_cache import SourceMap
+from facex_log import get_logger, setup_logging
+
+log = get_logger('batch')
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+_END = object()
+
+# 工作进程内常驻的模型，每个进程只加载一次
+_worker = {}
+
+
+def is_image_dir(path):
+    return os.path.isdir(path)
+
+
+def get_video_info(path):
+    """读取视频的帧率、尺寸和帧数"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频: {path}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    return fps, (width, height), count
+
+
+def open_video_at(path, start=0):
+    """打开视频并定位到第 start 帧
+
+    定位后读回的帧号与请求不一致时（部分编码和可变帧率视频定位不精确），重新打开并从头逐帧跳过。
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频: {path}")
+    if not start or (cap.set(cv2.CAP_PROP_POS_FRAMES, start) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == start):
+        return cap
+    log.warning("视频定位到第 %d 帧不精确，改为从头逐帧跳过", start)
+    cap.release()
+    cap = cv2.VideoCapture(path)
+    for index in range(start):
+        if not cap.grab():
+            cap.release()
+            raise IOError(f"视频在第 {index} 帧结束，无法定位到第 {start} 帧: {path}")
+    return cap
+
+
+def iter_video_frames(path, start=0, end=None):
+    """顺序解码视频的 [start, end) 帧（end 为 None 时到文件末尾），产出 (帧序号, 帧)，内存中只保留当前帧"""
+    cap = open_video_at(path, start)
+    try:
+        index = start
+        while end is None or index < end:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def list_images(path):
+    return sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTS))
+
+
+def iter_image_frames(path):
+    """逐张读取目录中的图像，产出 (文件名, 图像)"""
+    for name in list_images(path):
+        img = cv2.imread(os.path.join(path, name))
+        if img is None:
+            log.warning("跳过无法读取的图像: %s", name)
+            continue
+        yield name, img
+
+
+def prefetch(iterable, size=8):
+    """在后台线程中预读，队列有界，解码与推理可以重叠进行"""
+    buffer = queue.Queue(maxsize=max(1, size))
+    errors = []
+
+    def producer():
+        try:
+            for item in iterable:
+                buffer.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            buffer.put(_END)
+
+    thread = threading.Thread(target=producer, name="prefetch", daemon=True)
+    thread.start()
+    while True:
+        item = buffer.get()
+        if item is _END:
+            break
+        yield item
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def build_source(analyzer, source_path, mappings=None):
+    """加载源人脸；mappings 为 [(目标人物图像, 源人脸图像)] 时返回 SourceMap 和目标帧所需的分析配置"""
+    source_face = load_source_face(source_path, analyzer)
+    if not mappings:
+        return source_face, 'detection'
+    source_map = SourceMap(default=source_face)
+    for target_path, mapped_path in mappings:
+        target_face = load_source_face(target_path, analyzer)
+        source_map.add(target_path, target_face.embedding, load_source_face(mapped_path, analyzer))
+    return source_map, 'identity'
+
+
+def swap_stream(frames, analyzer, swapper, source_face, max_faces=1):
+    """对帧流逐帧换脸"""
+    for key, frame in frames:
+        yield key, swap_faces_in_frame(frame, analyzer, swapper, source_face, max_faces=max_faces)
+
+
+def write_video(frames, path, fps, size, codec='mp4v'):
+    """将帧流编码写入视频文件，返回写入帧数"""
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+    if not out.isOpened():
+        raise IOError(f"无法创建输出视频: {path}")
+    count = 0
+    try:
+        for _, frame in frames:
+            out.write(frame)
+            count += 1
+    finally:
+        out.release()
+    return count
+
+
+def write_images(frames, out_dir):
+    """将帧流按原文件名写入目录，返回写入数量"""
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for name, frame in frames:
+        cv2.imwrite(os.path.join(out_dir, name), frame)
+        count += 1
+    return count
+
+
+def report_progress(frames, total=None, every=100):
+    """每处理 every 帧打印一次进度"""
+    start = time.time()
+    count = 0
+    for item in frames:
+        count += 1
+        if count % every == 0:
+            elapsed = time.time() - start
+            total_text = f"/{total}" if total else ""
+            print(f"已处理 {count}{total_text} 帧，{count / elapsed:.1f} FPS")
+        yield item
+
+
+def run_batch(input_path, output_path, source_path, det_size=(640, 640), model_path='inswapper_128.onnx',
+              codec='mp4v', prefetch_size=8, max_faces=1, mappings=None, config=None):
+    """无界面批量换脸：输入视频或图像目录，输出视频或图像目录"""
+    config = config or RuntimeConfig()
+    print(f"ONNX Runtime 配置: {config.describe()}")
+    analyzer = init_face_analyzer(det_size=det_size, config=config)
+    swapper = init_face_swapper(model_path, config=config)
+    report_sessions(dict(analyzer.models, swapper=swapper), det_size)
+    source_face, profile = build_source(analyzer, source_path, mappings)
+    # 目标帧只运行检测模型（按人物映射时加上识别模型）
+    analyzer = ProfiledAnalyzer(analyzer, profile)
+
+    start = time.time()
+    if is_image_dir(input_path):
+        total = len(list_images(input_path))
+        frames = prefetch(iter_image_frames(input_path), prefetch_size)
+        frames = report_progress(swap_stream(frames, analyzer, swapper, source_face, max_faces), total)
+        count = write_images(frames, output_path)
+    else:
+        fps, size, total = get_video_info(input_path)
+        frames = prefetch(iter_video_frames(input_path), prefetch_size)
+        frames = report_progress(swap_stream(frames, analyzer, swapper, source_face, max_faces), total)
+        count = write_video(frames, output_path, fps, size, codec)
+
+    elapsed = time.time() - start
+    print(f"完成: {count} 帧，用时 {elapsed:.1f} 秒，输出: {output_path}")
+    return count
+
+
+def _init_worker(source_path, det_size, model_path, config, max_faces=1, mappings=None):
+    # 进程池初始化：加载检测器、换脸模型和源人脸
+    cv2.setNumThreads(1)
+    setup_logging()
+    analyzer = init_face_analyzer(det_size=det_size, config=config)
+    swapper = init_face_swapper(model_path, config=config)
+    source_face, profile = build_source(analyzer, source_path, mappings)
+    _worker['source_face'] = source_face
+    _worker['analyzer'] = ProfiledAnalyzer(analyzer, profile)
+    _worker['swapper'] = swapper
+    _worker['max_faces'] = max_faces
+
+
+def _swap_video_segment(task):
+    # 自行解码视频的一段连续帧，换脸后编码写入片段文件，只把片段路径和帧数返回父进程
+    input_path, start, end, segment_path, fps, size, codec = task
+    frames = prefetch(iter_video_frames(input_path, start, end))
+    swapped = swap_stream(frames, _worker['analyzer'], _worker['swapper'], _worker['source_face'],
+                          _worker['max_faces'])
+    return start, write_video(swapped, segment_path, fps, size, codec), segment_path
+
+
+def _swap_image_chunk(task):
+    # 换脸一组图像并直接写入输出目录
+    input_path, output_dir, names = task
+    count = 0
+    for name in names:
+        img = cv2.imread(os.path.join(input_path, name))
+        if img is None:
+            continue
+        img = swap_faces_in_frame(img, _worker['analyzer'], _worker['swapper'], _worker['source_face'],
+                                  max_faces=_worker['max_faces'])
+        cv2.imwrite(os.path.join(output_dir, name), img)
+        count += 1
+    return names, count
+
+
+def iter_ordered(pool, fn, tasks, max_pending):
+    """提交任务并按提交顺序产出结果，最多 max_pending 个任务在途，保证内存有界"""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(fn, (task,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def iter_chunks(items, chunk_size):
+    # 按 chunk_size 分组，可用于长度未知的帧流
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def split_segments(total, parts):
+    """把 total 帧分成最多 parts 个连续片段 [(起始帧, 结束帧)]，最后一段的结束帧为 None，读到文件末尾"""
+    parts = max(1, min(parts, total))
+    bounds = [total * i // parts for i in range(parts)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def concat_videos(paths, output_path, fps, size, codec='mp4v'):
+    """按顺序拼接编码参数相同的视频片段；有 ffmpeg 时直接复制码流，否则用 OpenCV 解码后重新编码"""
+    if shutil.which('ffmpeg') is None:
+        log.warning("未找到 ffmpeg，片段将重新编码一次再拼接")
+        frames = itertools.chain.from_iterable(iter_video_frames(path) for path in paths)
+        return write_video(frames, output_path, fps, size, codec)
+    list_path = os.path.join(os.path.dirname(paths[0]), 'segments.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in paths:
+            path = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{path}'\n")
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                    '-c', 'copy', output_path], check=True)
+
+
+def run_batch_parallel(input_path, output_path, source_path, workers, chunk_size=16, det_size=(640, 640),
+                       model_path='inswapper_128.onnx', codec='mp4v', max_faces=1, mappings=None, config=None):
+    """多进程离线换脸：每个进程只加载一次模型，结果按顺序重组
+
+    视频按进程数分成连续片段，每个进程自行定位、解码并编码写入片段文件，父进程只传递帧范围、
+    最后拼接片段，帧数据不经过进程间通信。图像目录按 chunk_size 张分组分发。
+    视频头中没有帧数时无法分段，退回单进程处理。
+    """
+    if not is_image_dir(input_path):
+        video_info = get_video_info(input_path)
+        if video_info[2] <= 0:
+            log.warning("视频头中没有帧数，无法分段，改用单进程处理")
+            return run_batch(input_path, output_path, source_path, det_size=det_size, model_path=model_path,
+                             codec=codec, max_faces=max_faces, mappings=mappings, config=config)
+    config = copy.copy(config) if config else RuntimeConfig()
+    if not config.intra_threads:
+        # 未指定线程数时按核数均分，避免多个进程的线程互相争抢
+        config.intra_threads = max(1, (os.cpu_count() or 1) // workers)
+        config.inter_threads = config.inter_threads or 1
+    print(f"ONNX Runtime 配置: {config.describe()}")
+
+    start = time.time()
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(workers, initializer=_init_worker,
+                  initargs=(source_path, det_size, model_path, config, max_faces, mappings)) as pool:
+        if is_image_dir(input_path):
+            os.makedirs(output_path, exist_ok=True)
+            names = list_images(input_path)
+            tasks = ((input_path, output_path, chunk) for chunk in iter_chunks(names, chunk_size))
+            count = 0
+            for _, done in iter_ordered(pool, _swap_image_chunk, tasks, workers * 2):
+                count += done
+                print(f"已处理 {count}/{len(names)} 张图像")
+        else:
+            fps, size, total = video_info
+            segments = split_segments(total, workers)
+            # 片段文件写在输出文件旁的临时目录中，拼接后删除
+            segment_dir = tempfile.mkdtemp(prefix='.facex-segments-',
+                                           dir=os.path.dirname(os.path.abspath(output_path)))
+            ext = os.path.splitext(output_path)[1] or '.mp4'
+            try:
+                tasks = [(input_path, start, end, os.path.join(segment_dir, f"{i:04d}{ext}"), fps, size, codec)
+                         for i, (start, end) in enumerate(segments)]
+                count = 0
+                paths = []
+                for (start, end), (_, done, path) in zip(segments, iter_ordered(pool, _swap_video_segment, tasks,
+                                                                              workers)):
+                    # 中间片段必须写满分配的帧数，否则之后的帧全部错位
+                    if end is not None and done != end - start:
+                        raise RuntimeError(f"片段 [{start}, {end}) 写入了 {done} 帧，与分配的帧数不一致")
+                    count += done
+                    paths.append(path)
+                    print(f"已处理 {count}/{total} 帧")
+                concat_videos(paths, output_path, fps, size, codec)
+            finally:
+                shutil.rmtree(segment_dir, ignore_errors=True)
+            if count != total:
+                log.warning("解码得到 %d 帧，与视频头中的帧数 %d 不一致", count, total)
+
+    elapsed = time.time() - start
+    print(f"完成: {count} 帧，{workers} 个进程，用时 {elapsed:.1f} 秒，输出: {output_path}")
+    return count
+
+
+def parse_det_size(value):
+    parts = value.lower().split('x')
+    if len(parts) == 1:
+        parts = parts * 2
+    return int(parts[0]), int(parts[1])
+
+
+def parse_mapping(value):
+    target, sep, source = value.partition('=')
+    if not sep or not target or not source:
+        raise argparse.ArgumentTypeError(f"映射格式应为 目标人物图像=源人脸图像: {value}")
+    return target, source
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="FaceX 无界面批量换脸")
+    parser.add_argument('-s', '--source', required=True, help="源人脸图像")
+    parser.add_argument('-i', '--input', required=True, help="输入视频文件或图像目录")
+    parser.add_argument('-o', '--output', required=True, help="输出视频文件或图像目录")
+    parser.add_argument('--det-size', default='640x640', type=parse_det_size, help="检测输入尺寸，例如 640x640")
+    parser.add_argument('--model', default='inswapper_128.onnx', help="换脸模型路径")
+    parser.add_argument('--codec', default='mp4v', help="输出视频的 FourCC 编码")
+    parser.add_argument('--prefetch', default=8, type=int, help="预读帧队列长度")
+    parser.add_argument('-j', '--workers', default=1, type=int, help="工作进程数，大于 1 时启用多进程模式")
+    parser.add_argument('--chunk-size', default=16, type=int, help="多进程模式下处理图像目录时每个任务的图像数；视频按进程数分段")
+    parser.add_argument('--max-faces', default=1, type=int, help="每帧替换的人脸数，0 表示全部")
+    parser.add_argument('--map', dest='mappings', action='append', type=parse_mapping, default=[],
+                        help="按人物指定源人脸，格式 目标人物图像=源人脸图像，可重复；未匹配的人脸使用 -s")
+    add_runtime_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    max_faces = args.max_faces or None
+    config = RuntimeConfig.from_args(args)
+    if args.workers > 1:
+        run_batch_parallel(args.input, args.output, args.source, args.workers, chunk_size=args.chunk_size,
+                           det_size=args.det_size, model_path=args.model, codec=args.codec,
+                           max_faces=max_faces, mappings=args.mappings, config=config)
+        return 0
+    run_batch(args.input, args.output, args.source, det_size=args.det_size, model_path=args.model,
+              codec=args.codec, prefetch_size=args.prefetch, max_faces=max_faces, mappings=args.mappings,
+              config=config)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,538 @@
+import threading
+
+import cv2
+import numpy as np
+
+from facex_log import get_logger
+
+log = get_logger('beauty')
+
+
+def load_image(path):
+    """加载并验证图像"""
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError(f"无法加载图像：{path}")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def hist_match(source, template):
+    """直方图匹配实现（CPU版本）"""
+    src_hist = cv2.calcHist([source], [0], None, [256], [0, 256])
+    tgt_hist = cv2.calcHist([template], [0], None, [256], [0, 256])
+    src_cdf = np.cumsum(src_hist)
+    tgt_cdf = np.cumsum(tgt_hist)
+    src_cdf_normalized = src_cdf / src_cdf[-1]
+    tgt_cdf_normalized = tgt_cdf / tgt_cdf[-1]
+    lut = np.interp(src_cdf_normalized, tgt_cdf_normalized, np.arange(256))
+    return cv2.LUT(source, lut.astype(np.uint8))
+
+
+def adjust_lighting(src, target):
+    """光照一致性调整（CPU版本）"""
+    result = np.zeros_like(src)
+    for i in range(3):
+        result[:, :, i] = hist_match(src[:, :, i], target[:, :, i])
+    return result
+
+
+class WarpEngine:
+    """美颜变形引擎：按分辨率缓存坐标网格，只在人脸/眼睛区域内计算位移、remap 和混合，复用模糊核
+
+    变形结果直接写回传入的图像，开销只与人脸大小有关，与整帧分辨率无关。
+    网格按分辨率重建，实例不是线程安全的；多线程时每个线程使用各自的实例（见 default_engine）。
+    """
+
+    max_kernels = 64
+
+    def __init__(self):
+        self.shape = None
+        self.grid_x = None
+        self.grid_y = None
+        self.coarse_maps = {}
+        self.kernels = {}
+
+    def prepare(self, shape):
+        # 分辨率变化时才重建网格
+        h, w = shape[:2]
+        if self.shape == (h, w):
+            return
+        self.shape = (h, w)
+        self.grid_y, self.grid_x = np.indices((h, w), dtype=np.float32)
+        self.coarse_maps = {}
+
+    def coarse_map(self, step):
+        # 全分辨率像素在粗网格上的坐标，用于把粗网格结果插值回全分辨率
+        if step not in self.coarse_maps:
+            self.coarse_maps[step] = (self.grid_x / step, self.grid_y / step)
+        return self.coarse_maps[step]
+
+    def kernel(self, ksize, sigma):
+        key = (ksize, sigma)
+        if key not in self.kernels:
+            if len(self.kernels) >= self.max_kernels:
+                self.kernels.clear()
+            self.kernels[key] = cv2.getGaussianKernel(ksize, sigma, cv2.CV_32F)
+        return self.kernels[key]
+
+    def blur(self, mask, ksize, sigma):
+        k = self.kernel(ksize, sigma)
+        return cv2.sepFilter2D(mask, -1, k, k)
+
+    def roi(self, center, x_radius, y_radius):
+        # 变形区域的外接矩形，裁剪到图像范围内
+        h, w = self.shape
+        x0 = max(0, int(np.floor(center[0] - x_radius)))
+        y0 = max(0, int(np.floor(center[1] - y_radius)))
+        x1 = min(w, int(np.ceil(center[0] + x_radius)) + 1)
+        y1 = min(h, int(np.ceil(center[1] + y_radius)) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return slice(y0, y1), slice(x0, x1)
+
+    def expand(self, roi, margin):
+        h, w = self.shape
+        ys, xs = roi
+        return (slice(max(0, ys.start - margin), min(h, ys.stop + margin)),
+                slice(max(0, xs.start - margin), min(w, xs.stop + margin)))
+
+    @staticmethod
+    def relative(inner, outer):
+        # inner 区域在 outer 区域内的相对切片
+        return tuple(slice(i.start - o.start, i.stop - o.start) for i, o in zip(inner, outer))
+
+    def apply(self, img, roi, map_x, map_y, mask, ksize, sigma, interpolation=cv2.INTER_LINEAR):
+        """只在变形区域附近做 remap，并按平滑掩码混合后贴回 img"""
+        radius = ksize // 2
+        # 模糊后掩码非零的区域最多比变形区域大一个核半径
+        out = self.expand(roi, radius)
+        # 在再大一个核半径的区域内模糊，内侧边界不需要反射填充，结果与整帧模糊一致
+        pad = self.expand(roi, radius * 2)
+
+        pad_mask = np.zeros((pad[0].stop - pad[0].start, pad[1].stop - pad[1].start), dtype=np.float32)
+        pad_mask[self.relative(roi, pad)] = mask
+        smooth_mask = self.blur(pad_mask, ksize, sigma)[self.relative(out, pad)][:, :, None]
+
+        # 区域外的映射为恒等映射
+        out_map_x = self.grid_x[out].copy()
+        out_map_y = self.grid_y[out].copy()
+        inner = self.relative(roi, out)
+        out_map_x[inner] = map_x
+        out_map_y[inner] = map_y
+
+        warped = cv2.remap(img, out_map_x, out_map_y, interpolation)
+        region = img[out]
+        img[out] = (warped * smooth_mask + region * (1 - smooth_mask)).astype(np.uint8)
+        return img
+
+    def slim_face(self, img, face_center, face_width, face_strength):
+        """以面部中心为圆心的瘦脸/宽脸变形"""
+        self.prepare(img.shape)
+        h, w = self.shape
+        radius = face_width * 1.2
+        roi = self.roi(face_center, radius, radius)
+        if roi is None:
+            return img
+
+        # 坐标取整对精度敏感，这里用 float64 计算
+        X = self.grid_x[roi].astype(np.float64)
+        Y = self.grid_y[roi].astype(np.float64)
+        vx = X - face_center[0]
+        vy = Y - face_center[1]
+        norm = np.sqrt(vx ** 2 + vy ** 2)
+        dist = norm / face_width
+        mask = dist < 1.2
+        if not np.any(mask):
+            return img
+
+        # 变形方向从面部中心点向外，水平方向强度更大
+        strength = np.where(mask, (1 - dist) * face_strength * 1.5, 0) / (norm + 1e-8)
+        map_x = np.clip(X + vx * strength * 2.0, 0, w - 1)
+        map_y = np.clip(Y + vy * strength * 0.5, 0, h - 1)
+
+        # 与原实现保持一致：变形区域内的坐标取整
+        map_x = np.where(mask, np.floor(map_x), X)
+        map_y = np.where(mask, np.floor(map_y), Y)
+
+        return self.apply(img, roi, map_x, map_y, mask, 51, 15)
+
+    def enlarge_eye(self, img, center, x_radius, y_radius, scale_x, scale_y, pupil_radius=0.2):
+        """以眼睛中心为圆心的椭圆放大/缩小变形，返回 (结果, 是否变形)"""
+        self.prepare(img.shape)
+        h, w = self.shape
+        roi = self.roi(center, x_radius, y_radius)
+        if roi is None:
+            return img, False
+
+        X = self.grid_x[roi]
+        Y = self.grid_y[roi]
+        dx = X - center[0]
+        dy = Y - center[1]
+        dist = np.sqrt((dx / x_radius) ** 2 + (dy / y_radius) ** 2)
+        mask = (dist <= 1.0) & (dist > pupil_radius)
+        if not np.any(mask):
+            return img, False
+
+        mask_coef = np.where(mask, 1 - (dist - pupil_radius) / (1.0 - pupil_radius), 0)
+        map_x = np.clip(X + dx * mask_coef * (scale_x - 1) * 2.0, 0, w - 1)
+        map_y = np.clip(Y + dy * mask_coef * (scale_y - 1) * 2.0, 0, h - 1)
+
+        return self.apply(img, roi, map_x, map_y, mask, 31, 10), True
+
+    def slim_jaw(self, img, jaw_src, jaw_dst, thickness=20, ksize=51, sigma=15):
+        """沿下颌线的 MLS 瘦脸变形（68点），只在下颌线外接矩形（加上线宽和模糊半径）内计算映射和混合"""
+        self.prepare(img.shape)
+        jaw_src = np.asarray(jaw_src, dtype=np.float64)
+        # 掩码是沿下颌线画的粗线，模糊后最多再向外扩展一个核半径，区域外混合权重为 0
+        margin = thickness // 2 + ksize // 2 + 1
+        (x0, y0), (x1, y1) = jaw_src.min(axis=0), jaw_src.max(axis=0)
+        roi = self.roi(((x0 + x1) / 2, (y0 + y1) / 2), (x1 - x0) / 2 + margin, (y1 - y0) / 2 + margin)
+        if roi is None:
+            return img
+
+        grid = create_mls_grid(img.shape, jaw_src, jaw_dst, roi=roi, engine=self)
+        mask = np.zeros(grid.shape[:2], dtype=np.float32)
+        offset = np.array([roi[1].start, roi[0].start])
+        for pt1, pt2 in zip(jaw_src[:-1], jaw_src[1:]):
+            cv2.line(mask, tuple(map(int, pt1 - offset)), tuple(map(int, pt2 - offset)), 1.0, thickness)
+        return self.apply(img, roi, grid[:, :, 0], grid[:, :, 1], mask, ksize, sigma)
+
+
+# 默认变形引擎每个线程各一个：不同线程处理不同分辨率的帧时，共用的引擎会在另一线程计算中途重建网格
+_local = threading.local()
+
+
+def default_engine():
+    """当前线程的默认变形引擎，首次使用时创建"""
+    engine = getattr(_local, 'warp_engine', None)
+    if engine is None:
+        engine = _local.warp_engine = WarpEngine()
+    return engine
+
+
+def enlarge_eyes(img, landmarks, scale_x=1.0, scale_y=1.0, engine=None):
+    """改进的大眼效果（CPU版本）"""
+    if engine is None:
+        engine = default_engine()
+    result = img.copy()
+    engine.prepare(img.shape)
+
+    for eye_points in [range(36, 42), range(42, 48)]:
+        points = np.array([(landmarks.part(i).x, landmarks.part(i).y) for i in eye_points])
+        center = np.mean(points, axis=0).astype(int)
+
+        x_radius = int(np.max(np.abs(points[:, 0] - center[0])) * 2.5)
+        y_radius = int(np.max(np.abs(points[:, 1] - center[1])) * 2.5)
+
+        # 只处理眼睛外接矩形内的像素
+        roi = engine.roi(center, x_radius, y_radius)
+        if roi is None:
+            continue
+        X = engine.grid_x[roi]
+        Y = engine.grid_y[roi]
+
+        dx = X - center[0]
+        dy = Y - center[1]
+        dist = np.sqrt((dx / x_radius) ** 2 + (dy / y_radius) ** 2)
+
+        pupil_radius = 0.3
+        mask = (dist <= 1.0) & (dist > pupil_radius)
+
+        mask_coef = np.where(mask, 1 - (dist - pupil_radius) / (1.0 - pupil_radius), 0)
+        map_x = (center[0] + dx * (1 + mask_coef * (scale_x - 1))).astype(np.float32)
+        map_y = (center[1] + dy * (1 + mask_coef * (scale_y - 1))).astype(np.float32)
+
+        blend_mask = np.zeros(X.shape, dtype=np.float32)
+        cv2.ellipse(blend_mask,
+                    center=(int(center[0]) - roi[1].start, int(center[1]) - roi[0].start),
+                    axes=(x_radius, y_radius),
+                    angle=0,
+                    startAngle=0,
+                    endAngle=360,
+                    color=1.0,
+                    thickness=-1)
+
+        engine.apply(result, roi, map_x, map_y, blend_mask, 51, min(x_radius, y_radius) / 3,
+                     cv2.INTER_LANCZOS4)
+
+    return result
+
+
+def mls_displacement(points, src_points, dst_points, method='idw', alpha=1.0):
+    """计算一组点的变形位移 (N, 2)
+
+    method='idw'：反距离加权插值控制点位移（原有效果）
+    method='affine'：仿射 MLS（Schaefer 2006），每个点求解一个 2x2 加权最小二乘
+    """
+    dx = points[:, 0, None] - src_points[None, :, 0]
+    dy = points[:, 1, None] - src_points[None, :, 1]
+    dist2 = dx * dx + dy * dy
+
+    if method == 'idw':
+        weights = 1 / (np.sqrt(dist2) + 1e-8)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return weights @ (dst_points - src_points)
+
+    if method != 'affine':
+        raise ValueError(f"未知的变形方法: {method}")
+
+    weights = 1 / (dist2 ** alpha + 1e-8)
+    weight_sum = weights.sum(axis=1, keepdims=True)
+    p_star = weights @ src_points / weight_sum
+    q_star = weights @ dst_points / weight_sum
+    p_hat = src_points[None, :, :] - p_star[:, None, :]
+    q_hat = dst_points[None, :, :] - q_star[:, None, :]
+
+    # M = (Σ w p̂ᵀp̂)⁻¹ Σ w p̂ᵀq̂，加一个很小的正则项避免奇异
+    A = np.einsum('nk,nki,nkj->nij', weights, p_hat, p_hat) + np.eye(2, dtype=points.dtype) * 1e-6
+    B = np.einsum('nk,nki,nkj->nij', weights, p_hat, q_hat)
+    M = np.linalg.solve(A, B)
+    mapped = np.einsum('ni,nij->nj', points - p_star, M) + q_star
+    return mapped - points
+
+
+def create_mls_grid(shape, src_points, dst_points, step=8, method='idw', chunk_size=65536, roi=None, engine=None):
+    """MLS网格变形映射（CPU版本）
+
+    只在间隔 step 像素的粗网格上计算位移，再双线性插值到全分辨率；
+    粗网格按 chunk_size 分块计算，内存占用与图像分辨率基本无关。step=1 时为逐像素精确计算。
+    roi 为 (行切片, 列切片) 时只计算该区域，返回区域大小的映射（值仍为整帧坐标）。
+    """
+    engine = engine or default_engine()
+    engine.prepare(shape)
+    h, w = shape[:2]
+    if roi is None:
+        roi = (slice(0, h), slice(0, w))
+    ys, xs = roi
+    rh, rw = ys.stop - ys.start, xs.stop - xs.start
+    src_points = np.array(src_points, dtype=np.float32)
+    dst_points = np.array(dst_points, dtype=np.float32)
+    if method == 'affine':
+        # remap 需要反向映射：从目标位置找回源位置
+        src_points, dst_points = dst_points, src_points
+
+    step = max(1, int(step))
+    gh = (rh - 1) // step + 2 if step > 1 else rh
+    gw = (rw - 1) // step + 2 if step > 1 else rw
+    gy, gx = np.indices((gh, gw), dtype=np.float32)
+    coarse = np.stack([gx * step + xs.start, gy * step + ys.start], axis=-1).reshape(-1, 2)
+
+    disp = np.empty_like(coarse)
+    for start in range(0, len(coarse), chunk_size):
+        stop = start + chunk_size
+        disp[start:stop] = mls_displacement(coarse[start:stop], src_points, dst_points, method)
+    disp = disp.reshape(gh, gw, 2)
+
+    grid_x, grid_y = engine.grid_x[roi], engine.grid_y[roi]
+    if step > 1:
+        map_x, map_y = engine.coarse_map(step)
+        disp = cv2.remap(disp, map_x[roi] - xs.start / step, map_y[roi] - ys.start / step, cv2.INTER_LINEAR)
+
+        # 控制点附近位移变化剧烈，插值误差大，在小窗口内逐像素精确计算
+        refine = np.zeros((rh, rw), dtype=bool)
+        for x, y in src_points:
+            window = engine.roi((x, y), step * 2, step * 2)
+            if window is None:
+                continue
+            window = tuple(slice(max(a.start, b.start), min(a.stop, b.stop)) for a, b in zip(window, roi))
+            if window[0].start < window[0].stop and window[1].start < window[1].stop:
+                refine[engine.relative(window, roi)] = True
+        points = np.stack([grid_x[refine], grid_y[refine]], axis=-1)
+        if len(points):
+            disp[refine] = mls_displacement(points, src_points, dst_points, method)
+
+    return np.dstack((grid_x + disp[:, :, 0], grid_y + disp[:, :, 1]))
+
+
+def slim_face(img, landmarks, strength=0.3):
+    """改进的瘦脸效果（CPU版本）"""
+    jaw_src = [(landmarks.part(i).x, landmarks.part(i).y) for i in range(0, 17)]
+    center_x = img.shape[1] // 2
+
+    jaw_dst = [(x - (x - center_x) * strength, y) for x, y in jaw_src]
+
+    grid = create_mls_grid(img.shape, jaw_src, jaw_dst)
+
+    result = cv2.remap(img, grid[:, :, 0].astype(np.float32),
+                       grid[:, :, 1].astype(np.float32),
+                       cv2.INTER_LANCZOS4)
+
+    return result
+
+
+def process_image(img, landmarks, face_strength, eye_scale_x, eye_scale_y, engine=None):
+    """处理图像的主函数（CPU版本）"""
+    if engine is None:
+        engine = default_engine()
+    try:
+        result = img.copy()
+
+        # 调试输出按需格式化，关闭 DEBUG 时不产生开销
+        log.debug("所有特征点: %s", landmarks)
+
+        # 确保landmarks是numpy数组
+        landmarks = np.array(landmarks)
+        if landmarks.size == 0:
+            log.debug("特征点为空")
+            return img
+
+        log.debug("特征点形状: %s", landmarks.shape)
+
+        # 根据特征点形状调整处理方式
+        if landmarks.shape[0] == 5:  # 如果是5点特征点
+            # 使用5点特征点进行眼睛处理
+            left_eye = landmarks[0]  # 左眼中心
+            right_eye = landmarks[1]  # 右眼中心
+            nose = landmarks[2]  # 鼻子
+            left_mouth = landmarks[3]  # 左嘴角
+            right_mouth = landmarks[4]  # 右嘴角
+
+            # 计算面部中心点
+            eye_center = (left_eye + right_eye) / 2  # 两眼中心点
+            face_center = (eye_center + nose) / 2  # 面部中心点（眼睛中心点和鼻子的中点）
+
+            # 计算脸宽
+            face_width = np.linalg.norm(left_eye - right_eye) * 3.0
+
+            # 瘦脸/宽脸变形
+            result = engine.slim_face(result, face_center, face_width, face_strength)
+
+            # 计算眼睛半径
+            eye_radius = np.linalg.norm(left_eye - right_eye) * 0.3
+
+            # 处理左眼和右眼
+            for center in (left_eye, right_eye):
+                result, _ = engine.enlarge_eye(result, center, eye_radius, eye_radius, eye_scale_x, eye_scale_y)
+
+        else:  # 如果是68点特征点
+            # 使用原有的68点特征点处理方式
+            jaw_src = landmarks[0:17]
+            center_x = img.shape[1] // 2
+            jaw_dst = np.array([(x - (x - center_x) * face_strength * 1.5, y) for x, y in jaw_src])
+
+            # 下颌线区域的变形和平滑混合只在下颌线外接矩形内进行
+            result = engine.slim_jaw(result, jaw_src, jaw_dst)
+
+            # 处理眼睛
+            eye_count = 0
+            left_eye_indices = [36, 37, 38, 39, 40, 41]
+            right_eye_indices = [42, 43, 44, 45, 46, 47]
+            
+            for eye_indices in [left_eye_indices, right_eye_indices]:
+                try:
+                    eye_points = landmarks[eye_indices]
+                    
+                    if len(eye_points) < 6 or not np.all(np.isfinite(eye_points)):
+                        continue
+
+                    center = np.mean(eye_points, axis=0)
+                    if not np.all(np.isfinite(center)):
+                        continue
+
+                    x_diffs = eye_points[:, 0] - center[0]
+                    y_diffs = eye_points[:, 1] - center[1]
+                    
+                    if not np.all(np.isfinite(x_diffs)) or not np.all(np.isfinite(y_diffs)):
+                        continue
+
+                    x_radius = float(np.max(np.abs(x_diffs))) * 3.0
+                    y_radius = float(np.max(np.abs(y_diffs))) * 3.0
+
+                    if x_radius < 1.0 or y_radius < 1.0:
+                        x_radius = max(x_radius, 1.0)
+                        y_radius = max(y_radius, 1.0)
+
+                    result, warped = engine.enlarge_eye(result, center, x_radius, y_radius,
+                                                        eye_scale_x, eye_scale_y)
+                    if warped:
+                        eye_count += 1
+
+                except Exception as e:
+                    log.warning("处理眼睛时出错: %s", e)
+                    continue
+
+            log.debug("成功处理 %d 个眼睛", eye_count)
+
+        return result
+    except Exception as e:
+        log.warning("处理图像时出错: %s", e)
+        return img
+
+
+class LandmarkProvider:
+    """dlib 人脸检测与68点特征点：模型只在首次使用时加载一次，可在多帧、多线程之间共享
+
+    shape_predictor 只读，所有线程共享同一份；HOG 检测器很轻，每个线程各建一个以避免并发问题。
+    """
+
+    def __init__(self, predictor_path="shape_predictor_68_face_landmarks.dat", upsample=1):
+        self.predictor_path = predictor_path
+        self.upsample = upsample
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.predictor = None
+
+    def load(self):
+        # 双重检查，保证多线程下只加载一次
+        if self.predictor is None:
+            with self.lock:
+                if self.predictor is None:
+                    import dlib
+                    self.predictor = dlib.shape_predictor(self.predictor_path)
+        return self.predictor
+
+    def detector(self):
+        detector = getattr(self.local, 'detector', None)
+        if detector is None:
+            import dlib
+            detector = self.local.detector = dlib.get_frontal_face_detector()
+        return detector
+
+    def get(self, frame_rgb):
+        """检测第一张人脸，返回 (68, 2) 特征点数组，未检测到时返回 None"""
+        predictor = self.load()
+        faces = self.detector()(frame_rgb, self.upsample)
+        if len(faces) == 0:
+            return None
+        shape = predictor(frame_rgb, faces[0])
+        return np.array([(p.x, p.y) for p in shape.parts()], dtype=np.float32)
+
+    def get_batch(self, frames_rgb):
+        """对多帧依次检测，复用已加载的模型"""
+        return [self.get(frame) for frame in frames_rgb]
+
+
+# 默认特征点提供者，在首次调用 process_video_stream 时加载模型
+_landmark_provider = LandmarkProvider()
+
+
+def process_video_stream(video_frame, face_strength, eye_scale_x, eye_scale_y, provider=None):
+    """处理实时视频流的函数（CPU版本）"""
+    if provider is None:
+        provider = _landmark_provider
+    try:
+        if len(video_frame.shape) == 3 and video_frame.shape[2] == 3:
+            frame_rgb = cv2.cvtColor(video_frame, cv2.COLOR_BGR2RGB)
+        else:
+            frame_rgb = video_frame
+
+        landmarks = provider.get(frame_rgb)
+        if landmarks is None:
+            return video_frame
+
+        processed_frame = process_image(frame_rgb, landmarks, face_strength, eye_scale_x, eye_scale_y)
+
+        if len(video_frame.shape) == 3 and video_frame.shape[2] == 3:
+            processed_frame = cv2.cvtColor(processed_frame, cv2.COLOR_RGB2BGR)
+
+        return processed_frame
+
+    except Exception as e:
+        log.warning("处理视频帧时出错: %s", e)
+        return video_frame
+
+
+def process_video_batch(video_frames, face_strength, eye_scale_x, eye_scale_y, provider=None):
+    """批量处理多帧，共享同一份 dlib 模型"""
+    return [process_video_stream(frame, face_strength, eye_scale_x, eye_scale_y, provider)
+            for frame in video_frames]
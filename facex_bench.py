@@ -0,0 +1,553 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+RESOLUTIONS = {
+    '240p': (320, 240),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+}
+
+# 拆分前启动时一并导入的依赖
+EAGER_MODULES = ('insightface', 'requests', 'json', 'scipy.sparse.linalg', 'dlib')
+
+
+def dense_mls_grid(shape, src_points, dst_points):
+    """原实现：逐像素稠密反距离加权，权重矩阵为 (h*w, K)，仅作为基准对照"""
+    h, w = shape[:2]
+    Y, X = np.indices((h, w))
+
+    grid_points = np.stack([X, Y], axis=-1).reshape(-1, 2).astype(np.float32)
+
+    src_points = np.array(src_points, dtype=np.float32)
+    dst_points = np.array(dst_points, dtype=np.float32)
+
+    weights = np.zeros((len(grid_points), len(src_points)), dtype=np.float32)
+    for i, p in enumerate(src_points):
+        diff = grid_points - p
+        dist = np.sqrt(np.sum(diff ** 2, axis=1)) + 1e-8
+        weights[:, i] = 1 / dist
+
+    weights /= weights.sum(axis=1, keepdims=True)
+
+    delta = dst_points - src_points
+    grid_x = X + np.sum(weights * delta[:, 0], axis=1).reshape(h, w)
+    grid_y = Y + np.sum(weights * delta[:, 1], axis=1).reshape(h, w)
+
+    return np.dstack((grid_x, grid_y))
+
+
+def stock_paste_back(target_img, bgr_fake, aimg, M):
+    """insightface INSwapper.get 的贴回过程：整帧逆仿射、整帧腐蚀/模糊、浮点混合，仅作为基准对照"""
+    import cv2
+
+    IM = cv2.invertAffineTransform(M)
+    img_white = np.full((aimg.shape[0], aimg.shape[1]), 255, dtype=np.float32)
+    bgr_fake = cv2.warpAffine(bgr_fake, IM, (target_img.shape[1], target_img.shape[0]), borderValue=0.0)
+    img_white = cv2.warpAffine(img_white, IM, (target_img.shape[1], target_img.shape[0]), borderValue=0.0)
+    img_white[img_white > 20] = 255
+    img_mask = img_white
+    mask_h_inds, mask_w_inds = np.where(img_mask == 255)
+    mask_h = np.max(mask_h_inds) - np.min(mask_h_inds)
+    mask_w = np.max(mask_w_inds) - np.min(mask_w_inds)
+    mask_size = int(np.sqrt(mask_h * mask_w))
+    k = max(mask_size // 10, 10)
+    kernel = np.ones((k, k), np.uint8)
+    img_mask = cv2.erode(img_mask, kernel, iterations=1)
+    k = max(mask_size // 20, 5)
+    blur_size = (2 * k + 1, 2 * k + 1)
+    img_mask = cv2.GaussianBlur(img_mask, blur_size, 0)
+    img_mask /= 255
+    img_mask = np.reshape(img_mask, [img_mask.shape[0], img_mask.shape[1], 1])
+    fake_merged = img_mask * bgr_fake + (1 - img_mask) * target_img.astype(np.float32)
+    return fake_merged.astype(np.uint8)
+
+
+def synthetic_face(width, height, face_scale=0.4, angle=10.0, seed=0):
+    """生成一帧背景、一个 128x128 换脸结果和对应的对齐矩阵（人脸宽度为画面高度的 face_scale）"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    frame = cv2.GaussianBlur((rng.random((height, width, 3)) * 255).astype(np.uint8), (7, 7), 2)
+    fake = cv2.GaussianBlur((rng.random((128, 128, 3)) * 255).astype(np.uint8), (5, 5), 1.5)
+    face_size = height * face_scale
+    # 对齐矩阵：帧 -> 128x128，人脸中心在画面中央偏左上
+    M = cv2.getRotationMatrix2D((width * 0.45, height * 0.45), angle, 128 * 0.8 / face_size)
+    M[:, 2] += (64 - width * 0.45, 64 - height * 0.45)
+    aimg = cv2.warpAffine(frame, M, (128, 128), borderValue=0.0)
+    return frame, fake, aimg, M
+
+
+def synthetic_jaw(width, height, strength=0.3):
+    # 按分辨率生成一条 17 点下颌线及其瘦脸后的目标位置
+    t = np.linspace(0, np.pi, 17)
+    src = np.stack([width * (0.35 + 0.3 * t / np.pi), height * (0.35 + 0.35 * np.sin(t))], axis=1)
+    dst = src.copy()
+    dst[:, 0] -= (src[:, 0] - width / 2) * strength
+    return src.astype(np.float32), dst.astype(np.float32)
+
+
+def latency_stats(times):
+    # 单次调用耗时（毫秒）-> 吞吐量和延迟分位数
+    times = np.array(times)
+    p50, p95, p99 = np.percentile(times, (50, 95, 99))
+    return {'calls': len(times), 'per_s': float(1000 * len(times) / max(times.sum(), 1e-9)),
+            'mean_ms': float(times.mean()), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+            'max_ms': float(times.max())}
+
+
+def measure(fn, repeat=5, warmup=1):
+    """返回 (最后一次结果, 统计信息)，统计包含耗时和 numpy 分配的峰值内存"""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = np.array(times)
+    stats = {
+        'mean_ms': float(times.mean()),
+        'min_ms': float(times.min()),
+        'p95_ms': float(np.percentile(times, 95)),
+        'peak_mb': peak / 1024 / 1024,
+    }
+    return result, stats
+
+
+def bench_mls(resolutions, repeat=5, step=8, method='idw'):
+    """对比原稠密实现与粗网格实现的 MLS 网格计算"""
+    from facex_beauty import create_mls_grid
+
+    rows = []
+    for name in resolutions:
+        width, height = RESOLUTIONS[name]
+        src, dst = synthetic_jaw(width, height)
+        shape = (height, width)
+
+        reference, stats = measure(lambda: dense_mls_grid(shape, src, dst), repeat)
+        rows.append(dict(stats, resolution=name, impl='dense', max_err_px=0.0))
+
+        grid, stats = measure(lambda: create_mls_grid(shape, src, dst, step=step, method=method), repeat)
+        err = float(np.abs(grid - reference).max()) if method == 'idw' else float('nan')
+        rows.append(dict(stats, resolution=name, impl=f'{method}/step{step}', max_err_px=err))
+    return rows
+
+
+def bench_detect(image_dir='pictures', det_sizes=((160, 128), (320, 256), (640, 480), (640, 640)),
+                 frame_size=(320, 240), repeat=5):
+    """检测延迟 vs 检测输入尺寸：在 image_dir 的图像上逐尺寸计时，并统计检出的人脸数"""
+    import cv2
+    from facex_batch import iter_image_frames
+    from facex_core import init_face_analyzer
+
+    det_model = init_face_analyzer().det_model
+    images = [img for _, img in iter_image_frames(image_dir)]
+    if not images:
+        raise ValueError(f"目录中没有可用的图像: {image_dir}")
+    if frame_size:
+        # 与实时画面一致，先缩放到摄像头处理分辨率
+        images = [cv2.resize(img, frame_size) for img in images]
+
+    rows = []
+    for size in det_sizes:
+        def run():
+            return [det_model.detect(img, input_size=size, max_num=0, metric='default')[0] for img in images]
+
+        results, stats = measure(run, repeat)
+        rows.append(dict(stats, det_size=f"{size[0]}x{size[1]}", images=len(images),
+                         per_image_ms=stats['mean_ms'] / len(images),
+                         faces=sum(len(bboxes) for bboxes in results)))
+    return rows
+
+
+def bench_suite(image_dir='pictures', resolutions=('240p', '720p'), frames=30, source_path=None,
+                model_path='inswapper_128.onnx', det_size=(640, 640)):
+    """离线基准：在 image_dir 的图像和由其生成的合成视频上逐函数计时，输出吞吐量和延迟分位数
+
+    模型相关函数（init_face_analyzer、load_source_face、检测、swap_faces_in_frame）在 insightface 或模型不可用时跳过，
+    此时美颜使用合成的 5 点特征点。detect 为实时画面使用的只检测分析器，swap_faces_in_frame 复用其结果、只计换脸。
+    """
+    import cv2
+    from facex_batch import iter_image_frames, list_images
+    from facex_beauty import process_image, adjust_lighting, hist_match, create_mls_grid
+    from facex_startup import WARMUP_KPS
+    from facex_source import synthetic_video
+
+    images = [img for _, img in iter_image_frames(image_dir)]
+    if not images:
+        raise ValueError(f"目录中没有可用的图像: {image_dir}")
+
+    rows = []
+
+    def add(function, resolution, times, **extra):
+        if times:
+            rows.append(dict(latency_stats(times), function=function, resolution=resolution, **extra))
+
+    def timed(times, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append((time.perf_counter() - start) * 1000)
+        return result
+
+    analyzer = swapper = target_analyzer = source_face = None
+    try:
+        from facex_core import init_face_analyzer, init_face_swapper, load_source_face, swap_faces_in_frame, \
+            ProfiledAnalyzer
+        times = []
+        analyzer = timed(times, init_face_analyzer, det_size)
+        add('init_face_analyzer', '-', times)
+        target_analyzer = ProfiledAnalyzer(analyzer, 'detection')
+
+        # 逐张图像提取源人脸（没有人脸的图像计入耗时但不作为源）
+        times = []
+        paths = [source_path] if source_path else [os.path.join(image_dir, name) for name in list_images(image_dir)]
+        for path in paths:
+            try:
+                face = timed(times, load_source_face, path, analyzer)
+            except ValueError:
+                continue
+            source_face = source_face or face
+        add('load_source_face', '-', times, images=len(paths))
+
+        if os.path.exists(model_path):
+            times = []
+            swapper = timed(times, init_face_swapper, model_path)
+            add('init_face_swapper', '-', times)
+        else:
+            print(f"未找到换脸模型 {model_path}，跳过 swap_faces_in_frame")
+    except Exception as e:
+        print(f"模型不可用，跳过检测和换脸: {str(e)}")
+
+    for name in resolutions:
+        size = RESOLUTIONS[name]
+        times = defaultdict(list)
+        reference = cv2.resize(images[0], size)
+        jaw_src, jaw_dst = synthetic_jaw(*size)
+        fallback_kps = WARMUP_KPS * size
+        faces_found = 0
+        for frame in synthetic_video(images, size, frames):
+            faces = timed(times['detect'], target_analyzer.get, frame) if target_analyzer is not None else []
+            faces_found += len(faces)
+            if swapper is not None and source_face is not None and faces:
+                timed(times['swap_faces_in_frame'], swap_faces_in_frame, frame, target_analyzer, swapper,
+                      source_face, faces)
+            landmarks = faces[0].kps if faces else fallback_kps
+            timed(times['process_image'], process_image, frame, landmarks, 0.3, 1.2, 1.2)
+            timed(times['adjust_lighting'], adjust_lighting, frame, reference)
+            # hist_match 作用于单通道，adjust_lighting 对三个通道各调用一次
+            timed(times['hist_match'], hist_match, frame[:, :, 0], reference[:, :, 0])
+            timed(times['create_mls_grid'], create_mls_grid, frame.shape[:2], jaw_src, jaw_dst)
+        for function, values in times.items():
+            extra = {'faces': faces_found} if function == 'detect' else {}
+            add(function, name, values, **extra)
+    return rows
+
+
+def compare_results(old, new, threshold=0.1):
+    """按字符串字段（分辨率、实现、函数等）匹配两次结果的行，比较 p50（没有时用中位数或均值）耗时
+
+    变慢超过 threshold 的标记为 regression，变快超过 threshold 的标记为 faster。
+    """
+    def key(row):
+        return tuple(value for _, value in sorted(row.items()) if isinstance(value, str))
+
+    old_rows = {key(row): row for row in old['results']}
+    rows = []
+    for row in new['results']:
+        base = old_rows.get(key(row))
+        if base is None:
+            continue
+        metric = next((m for m in ('p50_ms', 'median_ms', 'mean_ms') if m in row and m in base), None)
+        if metric is None or not base[metric]:
+            continue
+        change = row[metric] / base[metric] - 1
+        status = 'regression' if change > threshold else 'faster' if change < -threshold else 'ok'
+        rows.append({'case': ' '.join(key(row)), 'metric': metric, 'old': base[metric], 'new': row[metric],
+                     'change_pct': change * 100, 'status': status})
+    return rows
+
+
+def bench_paste(resolutions, repeat=20, face_scale=0.4):
+    """换脸结果贴回：insightface 整帧实现 vs 人脸区域实现，并统计像素差异"""
+    from facex_swap import PasteBack
+
+    paster = PasteBack()
+    rows = []
+    for name in resolutions:
+        width, height = RESOLUTIONS[name]
+        frame, fake, aimg, M = synthetic_face(width, height, face_scale)
+
+        reference, stats = measure(lambda: stock_paste_back(frame, fake, aimg, M), repeat)
+        rows.append(dict(stats, resolution=name, impl='stock', max_diff=0, mean_diff=0.0, diff_gt1=0.0))
+
+        result, stats = measure(lambda: paster.paste(frame.copy(), fake, M), repeat)
+        diff = np.abs(result.astype(np.int16) - reference.astype(np.int16))
+        rows.append(dict(stats, resolution=name, impl='roi/uint8', max_diff=int(diff.max()),
+                         mean_diff=float(diff.mean()), diff_gt1=float((diff > 1).mean() * 100)))
+    return rows
+
+
+def bench_display(resolutions, view_size=(800, 600), repeat=50):
+    """每帧显示耗时：原 QLabel 路径（转 RGB、QPixmap、预缩放）vs FrameView（包装 BGR 缓冲区、绘制时缩放）
+
+    两者都同步重绘控件（repaint），没有屏幕时使用 offscreen 平台。
+    """
+    import cv2
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QImage, QPixmap
+    from PyQt5.QtWidgets import QApplication, QLabel
+    from facex_display import FrameView
+
+    app = QApplication.instance() or QApplication([])
+    label = QLabel()
+    label.setAlignment(Qt.AlignCenter)
+    views = {'frameview': FrameView(smooth=False), 'frameview/smooth': FrameView(smooth=True)}
+    for widget in [label] + list(views.values()):
+        widget.setStyleSheet("background-color: #2c2c30; border-radius: 15px; padding: 10px;")
+        widget.resize(*view_size)
+        widget.show()
+    app.processEvents()
+
+    def stock(frame, transform):
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w, ch = rgb.shape
+        pixmap = QPixmap.fromImage(QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888))
+        label.setPixmap(pixmap.scaled(label.size(), Qt.KeepAspectRatio, transform))
+        label.repaint()
+
+    def direct(view, frame):
+        view.set_frame(frame)
+        view.repaint()
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for name in resolutions:
+        width, height = RESOLUTIONS[name]
+        frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        for impl, transform in (('qlabel', Qt.FastTransformation), ('qlabel/smooth', Qt.SmoothTransformation)):
+            _, stats = measure(lambda: stock(frame, transform), repeat)
+            rows.append(dict(stats, resolution=name, impl=impl))
+        for impl, view in views.items():
+            _, stats = measure(lambda: direct(view, frame), repeat)
+            rows.append(dict(stats, resolution=name, impl=impl))
+    return rows
+
+
+def gui_modules(path='FaceX2.0.py'):
+    """GUI 脚本在显示窗口前导入的模块：按源码中的顶层 import 语句列出，随脚本的导入变化自动更新"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        modules += [name for name in names if name not in modules]
+    return tuple(modules)
+
+
+def import_profile(modules):
+    """在新的解释器中用 -X importtime 导入模块，返回 (总耗时 ms, {顶层模块: 累计耗时 ms})"""
+    lines = ["import time", "start = time.perf_counter()"]
+    for module in modules:
+        # 未安装的可选依赖跳过
+        lines += ["try:", f"    import {module}", "except ImportError:", "    pass"]
+    lines.append("print((time.perf_counter() - start) * 1000)")
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', '\n'.join(lines)], capture_output=True,
+                          text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        # 格式: import time: self [us] | cumulative | imported package，顶层模块没有缩进
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cum, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            cumulative[name.strip()] = int(cum) / 1000
+    return float(proc.stdout.strip().splitlines()[-1]), cumulative
+
+
+def bench_imports(repeat=5, top=8):
+    """窗口显示前的导入耗时：当前按需导入 vs 拆分前的全部导入"""
+    rows = []
+    heaviest = {}
+    gui = gui_modules()
+    for impl, modules in (('eager', gui + EAGER_MODULES), ('lazy', gui)):
+        totals = []
+        for _ in range(repeat):
+            total, cumulative = import_profile(modules)
+            totals.append(total)
+        totals = np.array(totals)
+        rows.append({'impl': impl, 'modules': len(modules), 'median_ms': float(np.median(totals)),
+                     'min_ms': float(totals.min())})
+        heaviest[impl] = sorted(cumulative.items(), key=lambda item: -item[1])[:top]
+
+    for impl, items in heaviest.items():
+        print(f"{impl} 累计耗时最多的顶层模块: " + ', '.join(f"{name} {ms:.0f}ms" for name, ms in items))
+    return rows
+
+
+def print_table(rows, columns):
+    widths = [max(len(col), *(len(format_cell(row.get(col))) for row in rows)) for col in columns]
+    print('  '.join(col.ljust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(format_cell(row.get(col)).ljust(width) for col, width in zip(columns, widths)))
+
+
+def format_cell(value):
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def environment():
+    """运行环境，随结果一起保存，便于跨提交、跨机器对比"""
+    import platform
+    import cv2
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpus': os.cpu_count(), 'numpy': np.__version__,
+            'opencv': cv2.__version__}
+
+
+def save_json(path, name, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'benchmark': name, 'time': time.time(), 'env': environment(), 'results': rows}, f,
+                  ensure_ascii=False, indent=2)
+    print(f"结果已保存: {path}")
+
+
+def parse_size(value):
+    # 与 facex_batch.parse_det_size 相同，这里不导入 facex_batch 以免 mls 基准依赖模型库
+    parts = value.lower().split('x')
+    if len(parts) == 1:
+        parts = parts * 2
+    return int(parts[0]), int(parts[1])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="FaceX 性能基准")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    mls = sub.add_parser('mls', help="MLS 网格变形：原稠密实现 vs 粗网格实现")
+    mls.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    mls.add_argument('--step', type=int, default=8, help="粗网格间隔（像素）")
+    mls.add_argument('--method', default='idw', choices=['idw', 'affine'])
+    mls.add_argument('--repeat', type=int, default=5)
+    mls.add_argument('--json', help="保存结果的 JSON 路径")
+
+    paste = sub.add_parser('paste', help="换脸结果贴回：整帧实现 vs 人脸区域实现（含像素差异）")
+    paste.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    paste.add_argument('--face-scale', type=float, default=0.4, help="人脸宽度占画面高度的比例")
+    paste.add_argument('--repeat', type=int, default=20)
+    paste.add_argument('--json', help="保存结果的 JSON 路径")
+
+    display = sub.add_parser('display', help="每帧显示耗时：QLabel/QPixmap 路径 vs FrameView")
+    display.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    display.add_argument('--view-size', type=parse_size, default=(800, 600), help="显示控件尺寸")
+    display.add_argument('--repeat', type=int, default=50)
+    display.add_argument('--json', help="保存结果的 JSON 路径")
+
+    imports = sub.add_parser('imports', help="窗口显示前的导入耗时（-X importtime）：按需导入 vs 全部导入")
+    imports.add_argument('--repeat', type=int, default=5)
+    imports.add_argument('--top', type=int, default=8, help="列出累计耗时最多的顶层模块数")
+    imports.add_argument('--json', help="保存结果的 JSON 路径")
+
+    suite = sub.add_parser('suite', help="离线基准：图像和合成视频上逐函数的吞吐量和延迟分位数")
+    suite.add_argument('--images', default='pictures', help="测试图像目录")
+    suite.add_argument('--resolutions', nargs='+', default=['240p', '720p'], choices=list(RESOLUTIONS))
+    suite.add_argument('--frames', type=int, default=30, help="每个分辨率的合成视频帧数")
+    suite.add_argument('--source', help="源人脸图像，默认使用目录中第一张检测到人脸的图像")
+    suite.add_argument('--model', default='inswapper_128.onnx', help="换脸模型路径")
+    suite.add_argument('--det-size', type=parse_size, default=(640, 640), help="检测输入尺寸")
+    suite.add_argument('--json', help="保存结果的 JSON 路径")
+
+    compare = sub.add_parser('compare', help="对比两次 --json 结果，变慢超过阈值时返回 1")
+    compare.add_argument('old', help="基准结果 JSON")
+    compare.add_argument('new', help="新结果 JSON")
+    compare.add_argument('--threshold', type=float, default=0.1, help="判定为回归的相对变化")
+    compare.add_argument('--json', help="保存对比结果的 JSON 路径")
+
+    detect = sub.add_parser('detect', help="检测延迟 vs 检测输入尺寸")
+    detect.add_argument('--images', default='pictures', help="测试图像目录")
+    detect.add_argument('--det-sizes', nargs='+', type=parse_size,
+                        default=[(160, 128), (320, 256), (640, 480), (640, 640)], help="检测输入尺寸，例如 320x256")
+    detect.add_argument('--frame-size', type=parse_size, default=(320, 240),
+                        help="检测前将图像缩放到的尺寸，0 表示保持原图")
+    detect.add_argument('--repeat', type=int, default=5)
+    detect.add_argument('--json', help="保存结果的 JSON 路径")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    from facex_log import setup_logging
+    setup_logging()
+    if args.command == 'mls':
+        rows = bench_mls(args.resolutions, args.repeat, args.step, args.method)
+        print_table(rows, ['resolution', 'impl', 'mean_ms', 'p95_ms', 'peak_mb', 'max_err_px'])
+    elif args.command == 'paste':
+        rows = bench_paste(args.resolutions, args.repeat, args.face_scale)
+        print_table(rows, ['resolution', 'impl', 'mean_ms', 'p95_ms', 'peak_mb', 'max_diff', 'mean_diff',
+                           'diff_gt1'])
+    elif args.command == 'display':
+        rows = bench_display(args.resolutions, args.view_size, args.repeat)
+        print_table(rows, ['resolution', 'impl', 'mean_ms', 'p95_ms', 'peak_mb'])
+    elif args.command == 'imports':
+        rows = bench_imports(args.repeat, args.top)
+        print_table(rows, ['impl', 'modules', 'median_ms', 'min_ms'])
+    elif args.command == 'suite':
+        rows = bench_suite(args.images, args.resolutions, args.frames, args.source, args.model, args.det_size)
+        print_table(rows, ['function', 'resolution', 'calls', 'per_s', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'])
+    elif args.command == 'compare':
+        results = []
+        for path in (args.old, args.new):
+            with open(path, encoding='utf-8') as f:
+                results.append(json.load(f))
+        for label, result in zip(('old', 'new'), results):
+            print(f"{label}: {result.get('benchmark')} {result.get('env', {}).get('commit', '')}")
+        rows = compare_results(*results, threshold=args.threshold)
+        print_table(rows, ['case', 'metric', 'old', 'new', 'change_pct', 'status'])
+        if args.json:
+            save_json(args.json, 'compare', rows)
+        return 1 if any(row['status'] == 'regression' for row in rows) else 0
+    elif args.command == 'detect':
+        frame_size = args.frame_size if args.frame_size[0] > 0 else None
+        rows = bench_detect(args.images, args.det_sizes, frame_size, args.repeat)
+        print_table(rows, ['det_size', 'images', 'per_image_ms', 'mean_ms', 'p95_ms', 'faces'])
+    if args.json:
+        save_json(args.json, args.command, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from facex_core import load_source_face
+from facex_log import get_logger
+
+log = get_logger('cache')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.facex', 'face_cache')
+
+
+def file_hash(path, chunk_size=1 << 20):
+    # 按文件内容计算哈希，文件改名或移动后仍能命中缓存
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FaceCache:
+    """源人脸缓存：按图像内容哈希索引，内存 LRU + 磁盘持久化
+
+    磁盘上每个人脸保存为一个 npz 文件（embedding、kps、bbox 等），超过 max_disk 时删除最久未使用的条目。
+    tag 用于区分不同的模型/检测配置，配置变化后旧缓存不会被误用。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory=32, max_disk=256, tag='buffalo_l'):
+        self.cache_dir = cache_dir
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.tag = tag
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, img_path):
+        return f"{self.tag}_{file_hash(img_path)}"
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def get(self, key):
+        face = self.memory.get(key)
+        if face is not None:
+            self.memory.move_to_end(key)
+            return face
+
+        if not self.cache_dir or not os.path.exists(self.path(key)):
+            return None
+        try:
+            face = self.read(self.path(key))
+        except Exception as e:
+            log.warning("读取人脸缓存失败: %s", e)
+            return None
+        # 更新访问时间，用于磁盘 LRU
+        os.utime(self.path(key))
+        self.remember(key, face)
+        return face
+
+    def put(self, key, face):
+        self.remember(key, face)
+        if not self.cache_dir:
+            return
+        try:
+            self.write(self.path(key), face)
+            self.evict_disk()
+        except Exception as e:
+            log.warning("写入人脸缓存失败: %s", e)
+
+    def remember(self, key, face):
+        self.memory[key] = face
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory:
+            self.memory.popitem(last=False)
+
+    def load(self, img_path, analyzer):
+        """带缓存的 load_source_face"""
+        if not os.path.exists(img_path):
+            raise FileNotFoundError(f"无法加载源图像: {img_path}")
+        key = self.key(img_path)
+        face = self.get(key)
+        if face is not None:
+            self.hits += 1
+            return face
+        self.misses += 1
+        face = load_source_face(img_path, analyzer)
+        self.put(key, face)
+        return face
+
+    @staticmethod
+    def write(path, face):
+        # 只保存数组和数值字段，不使用 pickle
+        fields = {k: np.asarray(v) for k, v in face.items()
+                  if isinstance(v, (np.ndarray, np.generic, int, float))}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **fields)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read(path):
+        from insightface.app.common import Face
+        with np.load(path, allow_pickle=False) as data:
+            fields = {k: (data[k].item() if data[k].ndim == 0 else data[k]) for k in data.files}
+        return Face(**fields)
+
+    def evict_disk(self):
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                   if name.endswith('.npz')]
+        if len(entries) <= self.max_disk:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_disk]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        self.memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+class EmbeddingIndex:
+    """人脸特征索引：按余弦相似度查找最接近的已知人脸"""
+
+    def __init__(self):
+        self.labels = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @staticmethod
+    def normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        return embedding / (np.linalg.norm(embedding) + 1e-8)
+
+    def add(self, label, embedding):
+        vector = self.normalize(embedding)
+        if label in self.labels:
+            self.matrix[self.labels.index(label)] = vector
+            return
+        self.labels.append(label)
+        self.matrix = vector[None, :] if len(self.labels) == 1 else np.vstack([self.matrix, vector])
+
+    def remove(self, label):
+        if label not in self.labels:
+            return
+        row = self.labels.index(label)
+        self.labels.pop(row)
+        self.matrix = np.delete(self.matrix, row, axis=0)
+
+    def match(self, embedding, threshold=0.6):
+        """返回 (最相似的标签, 相似度)，相似度低于阈值时标签为 None"""
+        if not self.labels:
+            return None, 0.0
+        scores = self.matrix @ self.normalize(embedding)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        return (self.labels[best] if score >= threshold else None), score
+
+
+class SourceMap:
+    """多人换脸的人物映射：按目标人物的特征查找对应的源人脸，未登记的人物使用 default
+
+    查找需要目标人脸带 embedding，登记了映射时目标帧应使用 'identity' 分析配置。
+    """
+
+    def __init__(self, default=None, threshold=0.4):
+        self.default = default
+        self.threshold = threshold
+        self.index = EmbeddingIndex()
+        self.sources = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, label, target_embedding, source_face):
+        self.index.add(label, target_embedding)
+        self.sources[label] = source_face
+
+    def remove(self, label):
+        self.index.remove(label)
+        self.sources.pop(label, None)
+
+    def lookup(self, face):
+        embedding = face.get('embedding')
+        if embedding is None or not len(self.index):
+            return self.default
+        label, _ = self.index.match(embedding, self.threshold)
+        return self.sources[label] if label is not None else self.default
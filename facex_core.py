@@ -0,0 +1,324 @@
+import cv2
+import numpy as np
+
+# insightface 导入较慢（连带 onnxruntime、scikit-image 等），只在加载模型和构造人脸时导入
+from facex_profiler import StageProfiler
+from facex_runtime import RuntimeConfig
+from facex_swap import BatchSwapper
+
+# 分析配置：检测之外还需要运行的模型
+#   detection  只检测（bbox、5点kps），换脸目标帧使用
+#   landmarks  检测 + 106点特征点，需要密集特征点的美颜使用
+#   identity   检测 + 识别，多人换脸按人物映射源人脸时使用
+#   full       buffalo_l 全部模型（含 ArcFace 识别），源人脸使用
+ANALYZER_PROFILES = {
+    'detection': (),
+    'landmarks': ('landmark_2d_106',),
+    'identity': ('recognition',),
+    'full': None,
+}
+
+# 自适应模式下可选的检测输入尺寸 (宽, 高)，均为 32 的倍数，按 4:3 画面选取以减少填充
+DET_SIZES = ((160, 128), (320, 256), (640, 480))
+
+
+def init_face_analyzer(det_size=(640, 640), config=None):
+    # 初始化人脸检测器，执行提供者和会话参数由 RuntimeConfig 决定（默认优先 GPU）
+    from insightface.app import FaceAnalysis
+    config = config or RuntimeConfig()
+    providers = config.resolve_providers()
+    analyzer = FaceAnalysis(name='buffalo_l', providers=providers)
+    analyzer.prepare(ctx_id=config.ctx_id(providers), det_size=det_size)
+    config.apply(analyzer.models.values(), providers)
+    return analyzer
+
+
+def init_face_swapper(model_path='inswapper_128.onnx', config=None):
+    # 加载换脸模型；包装为批量推理，多张人脸一次会话调用
+    from insightface.model_zoo import get_model
+    config = config or RuntimeConfig()
+    providers = config.resolve_providers()
+    model = get_model(model_path, download=False, providers=providers)
+    config.apply([model], providers)
+    return BatchSwapper(model)
+
+
+class ProfiledAnalyzer:
+    """共享 FaceAnalysis 已加载的模型，只运行配置中需要的任务
+
+    换脸目标只需要 bbox 和 kps，跳过识别、性别年龄和3D特征点模型可以省去大半推理时间。
+    """
+
+    def __init__(self, analyzer, profile='detection', det_size_policy=None):
+        if profile not in ANALYZER_PROFILES:
+            raise ValueError(f"未知的分析配置: {profile}")
+        self.analyzer = analyzer
+        self.profile = profile
+        self.det_size_policy = det_size_policy
+        tasks = ANALYZER_PROFILES[profile]
+        self.models = {name: model for name, model in analyzer.models.items()
+                       if name != 'detection' and (tasks is None or name in tasks)}
+
+    @property
+    def det_model(self):
+        return self.analyzer.det_model
+
+    def prepare_sizes(self, sizes=None):
+        """在空白图像上预跑各个检测尺寸，提前建立锚点缓存和 ONNX 的形状相关内核"""
+        if sizes is None:
+            sizes = self.det_size_policy.sizes if self.det_size_policy is not None else ()
+        for width, height in sizes:
+            dummy = np.zeros((height, width, 3), dtype=np.uint8)
+            self.analyzer.det_model.detect(dummy, input_size=(width, height), max_num=0, metric='default')
+
+    def get(self, img, max_num=0):
+        if self.det_size_policy is None:
+            faces = self.detect(img, max_num)
+        else:
+            faces = self.detect(img, max_num, self.det_size_policy.select(img.shape))
+            self.det_size_policy.update(faces)
+        return faces
+
+    def detect(self, img, max_num=0, det_size=None):
+        from insightface.app.common import Face
+        bboxes, kpss = self.analyzer.det_model.detect(img, input_size=det_size, max_num=max_num,
+                                                      metric='default')
+        faces = []
+        for i in range(bboxes.shape[0]):
+            kps = kpss[i] if kpss is not None else None
+            face = Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4])
+            for model in self.models.values():
+                model.get(img, face)
+            faces.append(face)
+        return faces
+
+
+class AdaptiveDetSize:
+    """按上一次检测到的人脸大小逐帧选择检测输入尺寸
+
+    人脸足够大且在画面中部时选用能保证人脸宽度不小于 min_face 的最小尺寸；
+    没有人脸（重新捕获）或人脸靠近边缘（可能有新人脸进入）时使用最大尺寸。
+    """
+
+    def __init__(self, sizes=DET_SIZES, min_face=48, margin=0.1):
+        self.sizes = sorted(sizes, key=lambda size: size[0] * size[1])
+        self.min_face = min_face  # 人脸在检测输入中的最小宽度（像素）
+        self.margin = margin  # 画面边缘区域占宽高的比例
+        self.last_face = None
+        self.current = self.sizes[-1]
+        self.usage = {size: 0 for size in self.sizes}
+
+    def reset(self):
+        self.last_face = None
+
+    def is_centered(self, face, width, height):
+        x0, y0, x1, y1 = face.bbox[:4]
+        mx, my = width * self.margin, height * self.margin
+        return x0 >= mx and y0 >= my and x1 <= width - mx and y1 <= height - my
+
+    def select(self, shape):
+        height, width = shape[:2]
+        size = self.sizes[-1]
+        face = self.last_face
+        if face is not None and self.is_centered(face, width, height):
+            face_size = min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1])
+            for candidate in self.sizes:
+                # 与检测器的等比缩放一致：按较小的缩放比放入检测输入
+                scale = min(candidate[0] / width, candidate[1] / height)
+                if face_size * scale >= self.min_face:
+                    size = candidate
+                    break
+        self.current = size
+        self.usage[size] += 1
+        return size
+
+    def update(self, faces):
+        self.last_face = faces[0] if faces else None
+
+
+def load_source_face(img_path, analyzer):
+    # 加载源图像并提取人脸
+    source_img = cv2.imread(img_path)
+    if source_img is None:
+        raise FileNotFoundError(f"无法加载源图像: {img_path}")
+    faces = analyzer.get(source_img)
+    if not faces:
+        raise ValueError("未在源图像中检测到人脸")
+    return faces[0]
+
+
+def assign_sources(target_faces, source):
+    """为每张目标人脸选择源人脸：source 为单个人脸时全部使用它，为 SourceMap 时按人物查找"""
+    # facex_cache 依赖本模块，在这里导入；不能用 hasattr 判断，insightface 的 Face 访问任何属性都返回 None
+    from facex_cache import SourceMap
+    is_map = isinstance(source, SourceMap)
+    pairs = []
+    for face in target_faces:
+        source_face = source.lookup(face) if is_map else source
+        if source_face is not None:
+            pairs.append((face, source_face))
+    return pairs
+
+
+def swap_faces_in_frame(frame, analyzer, swapper, source_face, target_faces=None, max_faces=1):
+    # 在帧中进行人脸替换，已有检测结果时直接复用，避免重复检测
+    # max_faces 为同时替换的人脸数，None 表示全部
+    if target_faces is None:
+        target_faces = analyzer.get(frame)
+    if not target_faces:
+        return frame
+    pairs = assign_sources(target_faces if max_faces is None else target_faces[:max_faces], source_face)
+    if hasattr(swapper, 'swap_many'):
+        # 所有人脸合并为一次推理
+        return swapper.swap_many(frame, pairs)
+    for target_face, source in pairs:
+        frame = swapper.get(frame, target_face, source, paste_back=True)
+    return frame
+
+
+def get_face_landmarks(face):
+    """获取人脸特征点，优先使用5点kps"""
+    if getattr(face, 'kps', None) is not None:
+        return face.kps
+    if getattr(face, 'landmark', None) is not None:
+        return face.landmark
+    return None
+
+
+class LandmarkSmoother:
+    """特征点平滑：历史帧平均后与当前帧加权"""
+
+    def __init__(self, max_history=10, smooth_factor=0.85):
+        self.max_history = max_history
+        self.smooth_factor = smooth_factor
+        self.history = []
+
+    def reset(self):
+        self.history = []
+
+    def smooth(self, new_landmarks):
+        new_landmarks = np.asarray(new_landmarks, dtype=np.float32)
+        if not self.history:
+            self.history = [new_landmarks] * self.max_history
+            return new_landmarks
+
+        # 更新历史记录
+        self.history.pop(0)
+        self.history.append(new_landmarks)
+
+        # 计算平滑后的特征点
+        smoothed = np.mean(self.history, axis=0)
+
+        # 应用平滑因子
+        return self.smooth_factor * smoothed + (1 - self.smooth_factor) * new_landmarks
+
+
+class FrameResult:
+    """单帧处理结果"""
+
+    def __init__(self, frame, faces=None, face=None, landmarks=None, swapped=False):
+        self.frame = frame
+        self.faces = faces if faces is not None else []
+        self.face = face
+        self.landmarks = landmarks
+        self.swapped = swapped
+
+
+class FramePipeline:
+    """帧处理流水线：每帧最多检测一次，检测结果依次传给换脸、特征点平滑和美颜
+
+    传入 tracker 时只在关键帧上检测，中间帧用跟踪得到的人脸，换脸仍然每帧执行。
+    max_faces 不为 1 时替换多张人脸（None 表示全部），跟踪器只跟踪单人，此时每帧检测。
+    传入 profiler 时分别记录 detect（含跟踪）、swap、beauty 阶段的耗时。
+    process() 在推理线程中执行时，其他线程用 request_reset() 请求清除状态，由下一次 process() 开始时执行，
+    不与正在处理的帧并发修改平滑历史和跟踪器。
+    """
+
+    def __init__(self, analyzer, swapper, det_thresh=0.5, max_history=10, smooth_factor=0.85,
+                 beauty_fn=None, tracker=None, max_faces=1, profiler=None):
+        self.analyzer = analyzer
+        self.swapper = swapper
+        self.det_thresh = det_thresh
+        self.smoother = LandmarkSmoother(max_history, smooth_factor)
+        self.beauty_fn = beauty_fn
+        self.tracker = tracker if max_faces == 1 else None
+        self.max_faces = max_faces
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+        self.reset_requested = False
+
+        # 计数器：用于确认每个处理帧最多调用一次检测器
+        self.analyzer_calls = 0
+        self.frames_processed = 0
+        self.frames_tracked = 0
+
+    def detect(self, frame):
+        self.analyzer_calls += 1
+        return self.analyzer.get(frame)
+
+    def locate(self, frame):
+        """关键帧检测，中间帧跟踪；返回本帧的人脸列表"""
+        if self.tracker is not None and not self.tracker.needs_detection():
+            face = self.tracker.track(frame)
+            if face is not None:
+                self.frames_tracked += 1
+                return [face]
+
+        faces = self.detect(frame)
+        if self.tracker is not None:
+            if faces and faces[0].det_score > self.det_thresh:
+                self.tracker.init(frame, faces[0])
+            else:
+                self.tracker.reset()
+        return faces
+
+    def process(self, frame, source_face):
+        """检测（或跟踪）一次并换脸，返回 FrameResult"""
+        if self.reset_requested:
+            self.reset_requested = False
+            self.reset()
+        self.frames_processed += 1
+        with self.profiler.stage('detect'):
+            faces = self.locate(frame)
+        result = FrameResult(frame, faces)
+
+        if not faces or faces[0].det_score <= self.det_thresh:
+            return result
+
+        face = faces[0]
+        landmarks = get_face_landmarks(face)
+        if landmarks is None or len(landmarks) == 0:
+            return result
+
+        result.face = face
+        result.landmarks = self.smoother.smooth(landmarks)
+        if source_face is not None:
+            targets = [f for f in faces if f.det_score > self.det_thresh]
+            with self.profiler.stage('swap'):
+                result.frame = swap_faces_in_frame(frame, self.analyzer, self.swapper, source_face,
+                                                   target_faces=targets, max_faces=self.max_faces)
+            result.swapped = True
+        return result
+
+    def beautify(self, frame, landmarks, face_strength, eye_scale_x, eye_scale_y):
+        """美颜阶段，直接使用已平滑的特征点，不再检测"""
+        if self.beauty_fn is None or landmarks is None:
+            return frame
+        with self.profiler.stage('beauty'):
+            return self.beauty_fn(frame, landmarks, face_strength, eye_scale_x, eye_scale_y)
+
+    def request_reset(self):
+        """在下一帧处理前清除状态，可从推理线程以外的线程调用"""
+        self.reset_requested = True
+
+    def reset(self):
+        self.smoother.reset()
+        if self.tracker is not None:
+            self.tracker.reset()
+        policy = getattr(self.analyzer, 'det_size_policy', None)
+        if policy is not None:
+            policy.reset()
+
+    def calls_per_frame(self):
+        if self.frames_processed == 0:
+            return 0.0
+        return self.analyzer_calls / self.frames_processed
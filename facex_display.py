@@ -0,0 +1,119 @@
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QRect, QSize, Qt
+from PyQt5.QtGui import QColor, QFont, QImage, QPainter
+from PyQt5.QtWidgets import QLabel
+
+# Qt 5.14 起支持 BGR888，可直接包装 OpenCV 的 BGR 缓冲区
+HAS_BGR888 = hasattr(QImage, 'Format_BGR888')
+
+
+class FrameView(QLabel):
+    """视频显示控件：QImage 直接包装帧缓冲区，在 paintEvent 中一次缩放绘制到控件上
+
+    不生成 QPixmap，也不预先缩放；保持等比的目标区域只在控件或帧尺寸变化时重新计算。
+    快速缩小时直接包装 BGR 缓冲区（零拷贝）；平滑缩放或放大时 Qt 对 24 位格式逐帧转换很慢，
+    改为转换到复用的 BGRA 缓冲区（即 Qt 的 RGB32），只多一次拷贝。
+    继承 QLabel 以沿用原视频标签的样式表（背景、圆角、内边距）和尺寸设置。
+    set_hud() 设置叠加在画面左上角的文本；传入 profiler 时记录每帧的显示耗时（display 阶段）。
+    """
+
+    def __init__(self, parent=None, smooth=False, history=120, profiler=None):
+        super().__init__(parent)
+        self.smooth = smooth
+        self.profiler = profiler
+        self.hud = []
+        self.new_frame = False
+        self.frame = None  # 持有 numpy 缓冲区，保证 QImage 引用的内存在绘制前有效
+        self.bgra = None
+        self.image = None
+        self.frame_size = None
+        self.target = None
+        self.paint_ms = deque(maxlen=history)
+        self.set_ms = deque(maxlen=history)
+
+    def set_frame(self, frame):
+        """显示一帧 BGR uint8 图像；frame 在下一帧到来前不能被原地修改"""
+        start = time.perf_counter()
+        h, w = frame.shape[:2]
+        if self.frame_size != (w, h):
+            self.frame_size = (w, h)
+            self.target = None
+        if HAS_BGR888 and not self.smooth and self.target_rect().width() <= w:
+            frame = np.ascontiguousarray(frame)
+            self.image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
+        else:
+            if self.bgra is None or self.bgra.shape[:2] != (h, w):
+                self.bgra = np.empty((h, w, 4), dtype=np.uint8)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=self.bgra)
+            self.image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB32)
+        self.frame = frame
+        self.set_ms.append((time.perf_counter() - start) * 1000)
+        self.new_frame = True
+        self.update()
+
+    def set_hud(self, lines):
+        self.hud = list(lines or [])
+        self.update()
+
+    def clear_frame(self):
+        self.frame = None
+        self.image = None
+        self.frame_size = None
+        self.target = None
+        self.update()
+
+    def target_rect(self):
+        # 内容区域内保持宽高比并居中
+        if self.target is None:
+            area = self.contentsRect()
+            size = QSize(*self.frame_size).scaled(area.size(), Qt.KeepAspectRatio)
+            self.target = QRect(area.x() + (area.width() - size.width()) // 2,
+                                area.y() + (area.height() - size.height()) // 2, size.width(), size.height())
+        return self.target
+
+    def resizeEvent(self, event):
+        self.target = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        # 先由 QLabel 绘制样式表背景，再把帧缩放绘制到目标区域
+        super().paintEvent(event)
+        if self.image is None:
+            return
+        start = time.perf_counter()
+        painter = QPainter(self)
+        if self.smooth:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(self.target_rect(), self.image)
+        if self.hud:
+            self.draw_hud(painter)
+        painter.end()
+        paint_ms = (time.perf_counter() - start) * 1000
+        self.paint_ms.append(paint_ms)
+        # 同一帧因窗口重绘多次绘制时只记录一次
+        if self.profiler is not None and self.new_frame:
+            self.profiler.add('display', self.set_ms[-1] + paint_ms)
+        self.new_frame = False
+
+    def draw_hud(self, painter):
+        # 半透明底色 + 等宽文本，绘制在画面左上角
+        painter.setFont(QFont('Monospace', 9))
+        metrics = painter.fontMetrics()
+        width = max(metrics.horizontalAdvance(line) for line in self.hud) + 12
+        height = metrics.height() * len(self.hud) + 8
+        target = self.target_rect()
+        painter.fillRect(target.x(), target.y(), width, height, QColor(0, 0, 0, 160))
+        painter.setPen(QColor(255, 255, 255))
+        for i, line in enumerate(self.hud):
+            painter.drawText(target.x() + 6, target.y() + 4 + metrics.ascent() + i * metrics.height(), line)
+
+    def display_ms(self):
+        """最近若干帧的平均显示耗时（设置帧 + 绘制，毫秒）"""
+        if not self.paint_ms:
+            return 0.0
+        set_ms = sum(self.set_ms) / len(self.set_ms) if self.set_ms else 0.0
+        return set_ms + sum(self.paint_ms) / len(self.paint_ms)
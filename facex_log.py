@@ -0,0 +1,138 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+# 所有模块的日志记录器都在 facex 之下，例如 facex.core、facex.stream
+ROOT_LOGGER = 'facex'
+LOG_FORMATS = {
+    'text': '%(asctime)s %(levelname)-5s %(name)s: %(message)s',
+    'plain': '%(message)s',
+}
+
+_listener = None
+
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+class RateLimitFilter(logging.Filter):
+    """同一调用位置（文件 + 行号）在 interval 秒内最多输出 burst 条，被抑制的条数附加到下一条输出
+
+    逐帧路径中重复的告警和错误不会刷屏；min_level 以下的记录不限速，interval 为 0 时关闭限速。
+    """
+
+    def __init__(self, interval=1.0, burst=1, min_level=logging.NOTSET):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.min_level = min_level  # 低于此级别的记录不限速
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        # 同一条记录经过多个处理器时只判断一次
+        allowed = getattr(record, '_rate_allowed', None)
+        if allowed is None:
+            allowed = record._rate_allowed = self.check(record)
+        return allowed
+
+    def check(self, record):
+        if self.interval <= 0 or record.levelno < self.min_level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            start, count, suppressed = self.windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            if count >= self.burst:
+                self.windows[key] = (start, count, suppressed + 1)
+                return False
+            self.windows[key] = (start, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.getMessage()} (已抑制 {suppressed} 条)"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON，extra 中的字段一并输出，便于服务器上收集和检索"""
+
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {'time': round(record.created, 3), 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage(), 'thread': record.threadName}
+        for key, value in vars(record).items():
+            if key not in self.RESERVED and not key.startswith('_'):
+                entry[key] = value if isinstance(value, (int, float, str, bool, type(None))) else str(value)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, fmt=None, path=None, async_mode=None, rate_limit=None, environ=None):
+    """配置 facex 日志，未指定的参数从环境变量读取，可重复调用（以最后一次为准）
+
+    FACEX_LOG_LEVEL    DEBUG / INFO（默认）/ WARNING / ERROR
+    FACEX_LOG_FORMAT   text（默认）/ plain / json
+    FACEX_LOG_FILE     同时写入文件
+    FACEX_LOG_ASYNC    1 时经队列在后台线程输出，调用方只做入队
+    FACEX_LOG_RATE     同一调用位置的最短输出间隔（秒），默认 1，0 表示不限速
+    """
+    global _listener
+    env = os.environ if environ is None else environ
+    level = (level or env.get('FACEX_LOG_LEVEL', 'INFO')).upper()
+    fmt = fmt or env.get('FACEX_LOG_FORMAT', 'text')
+    path = path or env.get('FACEX_LOG_FILE')
+    async_mode = env.get('FACEX_LOG_ASYNC', '0') == '1' if async_mode is None else async_mode
+    rate_limit = float(env.get('FACEX_LOG_RATE', 1.0)) if rate_limit is None else rate_limit
+
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(LOG_FORMATS.get(fmt, fmt), '%H:%M:%S')
+    handlers = [logging.StreamHandler()]
+    if path:
+        handlers.append(logging.FileHandler(path, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    shutdown_logging()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    logger.setLevel(getattr(logging, level, logging.INFO))
+    logger.propagate = False
+    # 过滤器加在处理器上，子记录器（facex.core 等）的记录也会经过
+    rate_filter = RateLimitFilter(rate_limit)
+    if async_mode:
+        # 格式化和 I/O 在监听线程中完成，被限速的记录不入队
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(rate_filter)
+        logger.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(rate_filter)
+            logger.addHandler(handler)
+    return logger
+
+
+def shutdown_logging():
+    """停止异步监听线程并输出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
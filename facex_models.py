@@ -0,0 +1,242 @@
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from insightface.utils import face_align
+
+from facex_batch import iter_image_frames, parse_det_size
+from facex_core import init_face_analyzer, init_face_swapper
+from facex_runtime import RuntimeConfig, MODEL_VARIANTS, variant_path
+from facex_log import setup_logging
+
+QUANT_VARIANTS = MODEL_VARIANTS[1:]
+
+
+class FeedReader:
+    """onnxruntime 静态量化的校准数据读取器，逐个返回输入字典"""
+
+    def __init__(self, feeds):
+        self.feeds = iter(list(feeds))
+
+    def get_next(self):
+        return next(self.feeds, None)
+
+
+def detector_feeds(det_model, images, det_size=(640, 640)):
+    """按 SCRFD.detect 的预处理（等比缩放、左上角填充）生成检测器输入"""
+    width, height = det_size
+    feeds = []
+    for img in images:
+        if img.shape[0] / img.shape[1] > height / width:
+            new_height = height
+            new_width = int(new_height / (img.shape[0] / img.shape[1]))
+        else:
+            new_width = width
+            new_height = int(new_width * img.shape[0] / img.shape[1])
+        det_img = np.zeros((height, width, 3), dtype=np.uint8)
+        det_img[:new_height, :new_width] = cv2.resize(img, (new_width, new_height))
+        mean = det_model.input_mean
+        blob = cv2.dnn.blobFromImage(det_img, 1.0 / det_model.input_std, det_size, (mean, mean, mean), swapRB=True)
+        feeds.append({det_model.input_name: blob})
+    return feeds
+
+
+def swapper_feeds(swapper, faces):
+    """faces 为 [(图像, 人脸)]，每张人脸的对齐图像配合下一张人脸的特征作为源"""
+    model = swapper.model
+    mean = model.input_mean
+    feeds = []
+    for i, (img, face) in enumerate(faces):
+        crop, _ = face_align.norm_crop2(img, face.kps, swapper.input_size[0])
+        blob = cv2.dnn.blobFromImage(crop, 1.0 / model.input_std, swapper.input_size, (mean, mean, mean),
+                                     swapRB=True)
+        source = faces[(i + 1) % len(faces)][1]
+        feeds.append({model.input_names[0]: blob, model.input_names[1]: swapper.latent(source).astype(np.float32)})
+    return feeds
+
+
+def collect_faces(analyzer, images):
+    return [(img, face) for img in images for face in analyzer.get(img)]
+
+
+def quantize_model(model_file, variant, feeds=None):
+    """生成模型变体，返回输出路径；静态量化需要校准输入 feeds
+
+    输出写入模型目录下的 variants/ 子目录，FaceAnalysis 扫描模型目录时不会加载到变体。
+    """
+    out_path = variant_path(model_file, variant)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    if variant == 'int8-dynamic':
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(model_file, out_path, weight_type=QuantType.QInt8)
+    elif variant == 'int8-static':
+        from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+        quantize_static(model_file, out_path, FeedReader(feeds), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    elif variant == 'fp16':
+        try:
+            from onnxconverter_common import float16
+        except ImportError:
+            raise ImportError("生成 FP16 模型需要安装 onnxconverter-common")
+        import onnx
+        # 保持 float32 输入输出，运行时无需改动预处理
+        model = float16.convert_float_to_float16(onnx.load(model_file), keep_io_types=True)
+        onnx.save(model, out_path)
+    else:
+        raise ValueError(f"未知的模型变体: {variant}")
+    print(f"已生成 {variant}: {out_path}")
+    return out_path
+
+
+def load_models(det_size, model_path):
+    # 量化和评估都以 fp32 CPU 模型为基准
+    config = RuntimeConfig(providers=('cpu',))
+    return init_face_analyzer(det_size, config), init_face_swapper(model_path, config)
+
+
+def quantize(variants, image_dir='pictures', det_size=(640, 640), model_path='inswapper_128.onnx'):
+    """为检测器 det_10g 和 inswapper 生成量化变体，静态量化用 image_dir 中的图像校准"""
+    analyzer, swapper = load_models(det_size, model_path)
+    images = [img for _, img in iter_image_frames(image_dir)]
+    if not images:
+        raise ValueError(f"目录中没有可用的图像: {image_dir}")
+
+    det_feeds = swap_feeds = None
+    if 'int8-static' in variants:
+        det_feeds = detector_feeds(analyzer.det_model, images, det_size)
+        faces = collect_faces(analyzer, images)
+        if not faces:
+            raise ValueError(f"校准图像中没有检测到人脸: {image_dir}")
+        swap_feeds = swapper_feeds(swapper, faces)
+        print(f"校准数据: {len(det_feeds)} 张图像，{len(swap_feeds)} 张人脸")
+
+    for variant in variants:
+        quantize_model(analyzer.det_model.model_file, variant, det_feeds)
+        quantize_model(swapper.model_file, variant, swap_feeds)
+
+
+def time_session(session, feeds, repeat=3):
+    # 每个输入的平均推理耗时（毫秒），第一轮作为预热
+    for feed in feeds:
+        session.run(None, feed)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for feed in feeds:
+            session.run(None, feed)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(feeds))
+
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-8))
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def to_bgr(pred):
+    # inswapper 输出 (1, 3, 128, 128) RGB [0, 1] -> BGR uint8
+    return np.clip(255 * pred[0].transpose((1, 2, 0)), 0, 255).astype(np.uint8)[:, :, ::-1]
+
+
+def face_embeddings(analyzer, images):
+    # 每张图像第一张人脸的 ArcFace 特征（识别模型始终为 fp32），未检出时为 None
+    recognition = analyzer.models['recognition']
+    embeddings = []
+    for img in images:
+        bboxes, kpss = analyzer.det_model.detect(img, max_num=1, metric='default')
+        if len(bboxes) == 0:
+            embeddings.append(None)
+            continue
+        embeddings.append(recognition.get_feat([face_align.norm_crop(img, kpss[0])])[0])
+    return embeddings
+
+
+def swapped_identity(analyzer, fake):
+    # 128 对齐图像中 [0:112, 8:120] 正好是 ArcFace 的 112 对齐区域
+    return analyzer.models['recognition'].get_feat([fake[0:112, 8:120]])[0]
+
+
+def evaluate(variants, image_dir='pictures', det_size=(640, 640), model_path='inswapper_128.onnx', repeat=3):
+    """对比各变体与 fp32 的速度和质量
+
+    检测器：检出人脸的 ArcFace 特征与 fp32 检测结果的余弦相似度（反映关键点偏移）。
+    换脸模型：换脸结果与 fp32 结果的 PSNR，以及两者身份特征的余弦相似度。
+    """
+    import onnxruntime
+
+    analyzer, swapper = load_models(det_size, model_path)
+    images = [img for _, img in iter_image_frames(image_dir)]
+    det_model = analyzer.det_model
+    det_feeds = detector_feeds(det_model, images, det_size)
+    swap_feeds = swapper_feeds(swapper, collect_faces(analyzer, images))
+    options = RuntimeConfig().session_options()
+
+    rows = []
+    reference_embeddings = face_embeddings(analyzer, images)
+    reference_fakes = [to_bgr(swapper.session.run(None, feed)[0]) for feed in swap_feeds]
+    base_det_ms = base_swap_ms = None
+    det_session = det_model.session
+
+    for variant in ('fp32',) + tuple(variants):
+        det_path = variant_path(det_model.model_file, variant)
+        if os.path.exists(det_path):
+            det_model.session = onnxruntime.InferenceSession(det_path, options, providers=['CPUExecutionProvider'])
+            ms = time_session(det_model.session, det_feeds, repeat)
+            base_det_ms = base_det_ms or ms
+            scores = [cosine(ref, emb) if emb is not None else 0.0
+                      for ref, emb in zip(reference_embeddings, face_embeddings(analyzer, images)) if ref is not None]
+            rows.append({'model': 'detection', 'variant': variant, 'mean_ms': ms, 'speedup': base_det_ms / ms,
+                         'cos_mean': float(np.mean(scores)) if scores else float('nan'),
+                         'cos_min': float(np.min(scores)) if scores else float('nan')})
+            det_model.session = det_session
+
+        swap_path = variant_path(swapper.model_file, variant)
+        if os.path.exists(swap_path) and swap_feeds:
+            session = onnxruntime.InferenceSession(swap_path, options, providers=['CPUExecutionProvider'])
+            ms = time_session(session, swap_feeds, repeat)
+            base_swap_ms = base_swap_ms or ms
+            fakes = [to_bgr(session.run(None, feed)[0]) for feed in swap_feeds]
+            scores = [cosine(swapped_identity(analyzer, ref), swapped_identity(analyzer, fake))
+                      for ref, fake in zip(reference_fakes, fakes)]
+            rows.append({'model': 'swapper', 'variant': variant, 'mean_ms': ms, 'speedup': base_swap_ms / ms,
+                         'psnr_db': float(np.mean([psnr(ref, fake) for ref, fake in zip(reference_fakes, fakes)])),
+                         'cos_mean': float(np.mean(scores)), 'cos_min': float(np.min(scores))})
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="FaceX 模型准备：生成 INT8/FP16 变体并评估速度和质量")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('quantize', "生成检测器和换脸模型的变体"), ('evaluate', "对比各变体与 fp32 的速度和质量")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument('--variants', nargs='+', default=list(QUANT_VARIANTS), choices=list(QUANT_VARIANTS))
+        command.add_argument('--images', default='pictures', help="校准/评估图像目录")
+        command.add_argument('--det-size', default='640x640', type=parse_det_size, help="检测输入尺寸")
+        command.add_argument('--model', default='inswapper_128.onnx', help="换脸模型路径")
+    sub.choices['evaluate'].add_argument('--repeat', type=int, default=3)
+    sub.choices['evaluate'].add_argument('--json', help="保存结果的 JSON 路径")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    if args.command == 'quantize':
+        quantize(args.variants, args.images, args.det_size, args.model)
+        return 0
+
+    from facex_bench import print_table, save_json
+    rows = evaluate(args.variants, args.images, args.det_size, args.model, args.repeat)
+    print_table(rows, ['model', 'variant', 'mean_ms', 'speedup', 'psnr_db', 'cos_mean', 'cos_min'])
+    if args.json:
+        save_json(args.json, 'models', rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
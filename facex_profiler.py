@@ -0,0 +1,106 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from facex_log import get_logger
+
+log = get_logger('profiler')
+
+# 各阶段：采集、检测（含跟踪）、换脸、美颜、录制编码、显示，latency 为采集到显示的端到端延迟
+STAGES = ('capture', 'detect', 'swap', 'beauty', 'record', 'display', 'latency')
+PERCENTILES = (50, 95, 99)
+
+
+class StageProfiler:
+    """各阶段耗时的滚动窗口统计（毫秒），可在多个线程中同时记录
+
+    每个阶段保留最近 window 个样本，统计 p50/p95/p99；enabled 为 False 时 stage() 不计时。
+    """
+
+    def __init__(self, window=300, stages=STAGES, enabled=True):
+        self.window = window
+        self.stages = list(stages)
+        self.enabled = enabled
+        self.samples = {name: deque(maxlen=window) for name in self.stages}
+        self.counts = dict.fromkeys(self.stages, 0)
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def add(self, name, ms):
+        with self.lock:
+            if name not in self.samples:
+                self.stages.append(name)
+                self.samples[name] = deque(maxlen=self.window)
+                self.counts[name] = 0
+            self.samples[name].append(ms)
+            self.counts[name] += 1
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def reset(self):
+        with self.lock:
+            for name in self.stages:
+                self.samples[name].clear()
+                self.counts[name] = 0
+            self.start_time = time.time()
+
+    def summary(self):
+        """{阶段: 统计}，没有样本的阶段不列出；rate 为整个运行期间每秒的样本数"""
+        with self.lock:
+            samples = {name: np.array(self.samples[name]) for name in self.stages if self.samples[name]}
+            counts = dict(self.counts)
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        stats = {}
+        for name, values in samples.items():
+            p50, p95, p99 = np.percentile(values, PERCENTILES)
+            stats[name] = {'count': counts[name], 'rate': counts[name] / elapsed, 'mean_ms': float(values.mean()),
+                           'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+                           'max_ms': float(values.max())}
+        return stats
+
+    def hud_lines(self):
+        # 屏幕叠加显示用的简短文本，每阶段一行
+        lines = [f"{'ms':<9}{'p50':>7}{'p95':>7}{'p99':>7}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<9}{s['p50_ms']:7.1f}{s['p95_ms']:7.1f}{s['p99_ms']:7.1f}")
+        return lines
+
+    def export(self, path):
+        """按扩展名导出为 CSV 或 JSON，返回统计结果"""
+        stats = self.summary()
+        rows = [dict(stage=name, **s) for name, s in stats.items()]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.lower().endswith('.csv'):
+            columns = ['stage', 'count', 'rate', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'window': self.window, 'time': time.time(), 'stages': rows}, f, indent=2,
+                          ensure_ascii=False)
+        log.info("性能统计已保存: %s", path)
+        return stats
+
+    def report(self):
+        log.info("各阶段耗时:\n%s", '\n'.join(
+            f"  {name:<8} 次数 {s['count']:6d}  p50 {s['p50_ms']:7.1f} ms  p95 {s['p95_ms']:7.1f} ms  "
+            f"p99 {s['p99_ms']:7.1f} ms" for name, s in self.summary().items()))
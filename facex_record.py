@@ -0,0 +1,192 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+import cv2
+
+from facex_log import get_logger
+
+log = get_logger('record')
+
+# 录制后端
+RECORD_ENCODERS = ('opencv', 'ffmpeg')
+
+
+class VideoRecorder:
+    """异步录制：write() 只把帧放入队列，编码和写文件在独立线程中完成
+
+    按第一帧的分辨率写入，不做缩放。fps 为 None 时先缓存 probe 秒的帧，按实际到达速率确定输出帧率；
+    之后按帧的时间戳补帧/跳帧，使视频时长与实际录制时长一致。
+    encoder 为 ffmpeg 时把原始 BGR 帧通过管道交给 ffmpeg 编码（codec/crf/preset 可配置），找不到 ffmpeg 时退回 OpenCV。
+    传入 profiler 时记录每帧的编码写入耗时（record 阶段）。
+    """
+
+    def __init__(self, path, fps=None, encoder='opencv', codec=None, crf=23, preset='veryfast', probe=1.0,
+                 queue_size=120, profiler=None):
+        if encoder not in RECORD_ENCODERS:
+            raise ValueError(f"未知的录制后端: {encoder}")
+        if encoder == 'ffmpeg' and shutil.which('ffmpeg') is None:
+            log.warning("未找到 ffmpeg，改用 OpenCV 录制")
+            encoder = 'opencv'
+        self.path = path
+        self.fps = fps
+        self.encoder = encoder
+        self.codec = codec or ('libx264' if encoder == 'ffmpeg' else 'mp4v')
+        self.crf = crf
+        self.preset = preset
+        self.probe = probe
+        self.profiler = profiler
+
+        self.queue = queue.Queue(queue_size)
+        self.pending = []  # 确定帧率前缓存的 (时间戳, 帧)
+        self.writer = None
+        self.size = None
+        self.start_time = None
+        self.written = 0  # 写入的输出帧数（含补帧）
+        self.received = 0
+        self.dropped = 0  # 编码跟不上、队列已满时丢弃的帧
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="recorder", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_env(cls, path, environ=None, profiler=None):
+        """从环境变量读取录制参数，例如 FACEX_RECORD_ENCODER=ffmpeg FACEX_RECORD_CRF=20"""
+        env = os.environ if environ is None else environ
+        fps = env.get('FACEX_RECORD_FPS')
+        return cls(path, fps=float(fps) if fps else None,
+                   encoder=env.get('FACEX_RECORD_ENCODER', 'opencv'),
+                   codec=env.get('FACEX_RECORD_CODEC') or None,
+                   crf=int(env.get('FACEX_RECORD_CRF', 23)),
+                   preset=env.get('FACEX_RECORD_PRESET', 'veryfast'), profiler=profiler)
+
+    def write(self, frame, timestamp=None):
+        """非阻塞写入一帧；frame 在写入后不应再被修改"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait((time.time() if timestamp is None else timestamp, frame))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self.handle(*item)
+                except Exception as e:
+                    self.error = e
+                    log.error("录制出错: %s", e)
+            # stop() 时队列已满、结束标记没能放入，写完剩余的帧后自行退出
+            if self.closed and self.queue.empty():
+                break
+        try:
+            if self.error is None:
+                self.flush_pending()
+        finally:
+            self.release()
+
+    def handle(self, timestamp, frame):
+        self.received += 1
+        if self.start_time is None:
+            self.start_time = timestamp
+        if self.writer is not None:
+            self.encode(timestamp, frame)
+            return
+        self.pending.append((timestamp, frame))
+        if self.fps is not None or timestamp - self.start_time >= self.probe:
+            self.flush_pending()
+
+    def flush_pending(self):
+        # 确定帧率、打开编码器，再写入缓存的帧
+        if not self.pending:
+            return
+        if self.fps is None:
+            span = self.pending[-1][0] - self.pending[0][0]
+            self.fps = (len(self.pending) - 1) / span if span > 0 and len(self.pending) > 1 else 30.0
+            self.fps = min(max(round(self.fps, 2), 1.0), 120.0)
+        height, width = self.pending[0][1].shape[:2]
+        self.open(width, height)
+        pending, self.pending = self.pending, []
+        for timestamp, frame in pending:
+            self.encode(timestamp, frame)
+
+    def open(self, width, height):
+        self.size = (width, height)
+        if self.encoder == 'ffmpeg':
+            command = ['ffmpeg', '-y', '-loglevel', 'error',
+                       '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{self.fps}',
+                       '-i', '-', '-an', '-c:v', self.codec]
+            if self.crf is not None:
+                command += ['-crf', str(self.crf)]
+            if self.preset:
+                command += ['-preset', self.preset]
+            # yuv420p 要求宽高为偶数
+            command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', self.path]
+            self.writer = subprocess.Popen(command, stdin=subprocess.PIPE)
+        else:
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.codec), self.fps, self.size)
+            if not self.writer.isOpened():
+                raise IOError(f"无法创建视频文件: {self.path}")
+        log.info("开始录制: %s %dx%d @ %s fps (%s %s)", self.path, width, height, self.fps, self.encoder, self.codec)
+
+    def encode(self, timestamp, frame):
+        start = time.perf_counter()
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        # 按时间戳对应的输出帧序号补帧（处理慢于输出帧率）或跳帧（快于输出帧率）
+        target = int(round((timestamp - self.start_time) * self.fps)) + 1
+        repeat = max(target - self.written, 0) if self.written else 1
+        for _ in range(repeat):
+            if self.encoder == 'ffmpeg':
+                self.writer.stdin.write(frame.tobytes())
+            else:
+                self.writer.write(frame)
+        self.written += repeat
+        if self.profiler is not None:
+            self.profiler.add('record', (time.perf_counter() - start) * 1000)
+
+    def release(self):
+        if self.writer is None:
+            return
+        if self.encoder == 'ffmpeg':
+            self.writer.stdin.close()
+            self.writer.wait()
+        else:
+            self.writer.release()
+        self.writer = None
+
+    def stop(self):
+        """停止接收新帧，不等待；队列中的帧继续在录制线程中写完，用 finished() 查询"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def finished(self):
+        """剩余的帧已写完、文件已关闭"""
+        return not self.thread.is_alive()
+
+    def succeeded(self):
+        return self.error is None and self.written > 0
+
+    def close(self, timeout=None):
+        """停止接收新帧，等待队列中的帧写完；返回是否成功"""
+        self.stop()
+        self.thread.join(timeout)
+        return self.succeeded()
+
+    def stats(self):
+        return {'received': self.received, 'written': self.written, 'dropped': self.dropped, 'fps': self.fps}
@@ -0,0 +1,213 @@
+import os
+import time
+
+import numpy as np
+
+from facex_log import get_logger
+
+log = get_logger('runtime')
+
+# 执行提供者简称
+PROVIDER_ALIASES = {
+    'cuda': 'CUDAExecutionProvider',
+    'tensorrt': 'TensorrtExecutionProvider',
+    'openvino': 'OpenVINOExecutionProvider',
+    'dml': 'DmlExecutionProvider',
+    'coreml': 'CoreMLExecutionProvider',
+    'cpu': 'CPUExecutionProvider',
+}
+DEFAULT_PROVIDERS = ('cuda', 'cpu')
+
+GRAPH_OPT_LEVELS = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL',
+}
+
+# 模型变体：fp32 为原模型，其余为 facex_models.py 生成的 <模型目录>/variants/<名称>.<变体>.onnx。
+# 不能放在模型目录本身：FaceAnalysis 按文件名排序加载目录中的 *.onnx，每个任务取第一个，
+# det_10g.fp16.onnx 等会排在 det_10g.onnx 之前被当作 fp32 检测器加载
+MODEL_VARIANTS = ('fp32', 'int8-dynamic', 'int8-static', 'fp16')
+VARIANT_DIR = 'variants'
+
+ONNX_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(float16)': np.float16,
+}
+
+
+class RuntimeConfig:
+    """ONNX Runtime 执行配置：执行提供者、线程数、图优化级别和内存分配策略
+
+    线程数为 0 时使用 ONNX Runtime 的默认值；会话参数全部为默认值时不重建会话。
+    variant 不为 fp32 时，存在对应变体文件的模型（检测器、换脸模型）改为加载变体，其余模型保持 fp32。
+    """
+
+    def __init__(self, providers=DEFAULT_PROVIDERS, intra_threads=0, inter_threads=0, graph_opt='all',
+                 mem_arena=True, mem_pattern=True, parallel=False, variant='fp32'):
+        if graph_opt not in GRAPH_OPT_LEVELS:
+            raise ValueError(f"未知的图优化级别: {graph_opt}")
+        if variant not in MODEL_VARIANTS:
+            raise ValueError(f"未知的模型变体: {variant}")
+        self.providers = tuple(providers)
+        self.intra_threads = intra_threads
+        self.inter_threads = inter_threads
+        self.graph_opt = graph_opt
+        self.mem_arena = mem_arena
+        self.mem_pattern = mem_pattern
+        self.parallel = parallel  # 并行执行模式，inter_threads 只在此模式下生效
+        self.variant = variant
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """从环境变量读取配置，例如 FACEX_PROVIDERS=openvino,cpu FACEX_INTRA_THREADS=8"""
+        env = os.environ if environ is None else environ
+        providers = env.get('FACEX_PROVIDERS')
+        return cls(providers=providers.split(',') if providers else DEFAULT_PROVIDERS,
+                   intra_threads=int(env.get('FACEX_INTRA_THREADS', 0)),
+                   inter_threads=int(env.get('FACEX_INTER_THREADS', 0)),
+                   graph_opt=env.get('FACEX_GRAPH_OPT', 'all'),
+                   mem_arena=env.get('FACEX_MEM_ARENA', '1') != '0',
+                   mem_pattern=env.get('FACEX_MEM_PATTERN', '1') != '0',
+                   parallel=env.get('FACEX_PARALLEL_EXEC', '0') == '1',
+                   variant=env.get('FACEX_MODEL_VARIANT', 'fp32'))
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(providers=args.providers, intra_threads=args.intra_threads or 0,
+                   inter_threads=args.inter_threads, graph_opt=args.graph_opt, mem_arena=not args.no_mem_arena,
+                   mem_pattern=not args.no_mem_pattern, parallel=args.parallel_exec, variant=args.variant)
+
+    def provider_names(self):
+        return [PROVIDER_ALIASES.get(name.strip().lower(), name.strip()) for name in self.providers]
+
+    def resolve_providers(self):
+        """按顺序保留当前可用的执行提供者，并始终以 CPU 兜底"""
+        import onnxruntime
+        available = onnxruntime.get_available_providers()
+        providers = [name for name in self.provider_names() if name in available]
+        missing = [name for name in self.provider_names() if name not in available]
+        if missing:
+            log.warning("执行提供者不可用，已跳过: %s", ', '.join(missing))
+        if 'CPUExecutionProvider' not in providers:
+            providers.append('CPUExecutionProvider')
+        return providers
+
+    @staticmethod
+    def ctx_id(providers):
+        # insightface 在 ctx_id < 0 时把会话改为只用 CPU，其余提供者需要 ctx_id >= 0
+        return -1 if providers == ['CPUExecutionProvider'] else 0
+
+    def is_default(self):
+        return (not self.intra_threads and not self.inter_threads and self.graph_opt == 'all'
+                and self.mem_arena and self.mem_pattern and not self.parallel)
+
+    def session_options(self):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if self.intra_threads:
+            options.intra_op_num_threads = self.intra_threads
+        if self.inter_threads:
+            options.inter_op_num_threads = self.inter_threads
+        options.graph_optimization_level = getattr(onnxruntime.GraphOptimizationLevel,
+                                                   GRAPH_OPT_LEVELS[self.graph_opt])
+        options.enable_cpu_mem_arena = self.mem_arena
+        options.enable_mem_pattern = self.mem_pattern
+        options.execution_mode = (onnxruntime.ExecutionMode.ORT_PARALLEL if self.parallel
+                                  else onnxruntime.ExecutionMode.ORT_SEQUENTIAL)
+        return options
+
+    def model_path(self, model_file):
+        """当前变体的模型文件，变体文件不存在时使用原模型"""
+        path = variant_path(model_file, self.variant)
+        return path if os.path.exists(path) else model_file
+
+    def apply(self, models, providers):
+        """insightface 加载模型时不透传 SessionOptions，有自定义参数或模型变体时按配置重建会话"""
+        models = list(models)
+        paths = [self.model_path(model.model_file) for model in models]
+        if self.is_default() and paths == [model.model_file for model in models]:
+            return
+        rebuild_sessions(models, self.session_options(), providers, paths)
+
+    def describe(self):
+        threads = f"intra={self.intra_threads or '默认'} inter={self.inter_threads or '默认'}"
+        return (f"providers={','.join(self.provider_names())} {threads} graph_opt={self.graph_opt} "
+                f"mem_arena={self.mem_arena} mem_pattern={self.mem_pattern} parallel={self.parallel} "
+                f"variant={self.variant}")
+
+
+def add_runtime_arguments(parser):
+    group = parser.add_argument_group("ONNX Runtime")
+    group.add_argument('--providers', nargs='+', default=list(DEFAULT_PROVIDERS),
+                       help="执行提供者，按优先级排列：cuda tensorrt openvino dml coreml cpu")
+    group.add_argument('--intra-threads', '--threads', dest='intra_threads', default=None, type=int,
+                       help="每个会话的算子内线程数，多进程模式下默认按核数均分")
+    group.add_argument('--inter-threads', default=0, type=int, help="算子间线程数，仅在 --parallel-exec 时生效")
+    group.add_argument('--graph-opt', default='all', choices=list(GRAPH_OPT_LEVELS), help="图优化级别")
+    group.add_argument('--no-mem-arena', action='store_true', help="关闭 CPU 内存池")
+    group.add_argument('--no-mem-pattern', action='store_true', help="关闭内存复用规划")
+    group.add_argument('--parallel-exec', action='store_true', help="使用并行执行模式")
+    group.add_argument('--variant', default='fp32', choices=list(MODEL_VARIANTS),
+                       help="检测器和换脸模型的变体，需先用 facex_models.py quantize 生成")
+    return group
+
+
+def variant_path(model_file, variant):
+    if variant == 'fp32':
+        return model_file
+    directory, name = os.path.split(model_file)
+    root, ext = os.path.splitext(name)
+    return os.path.join(directory, VARIANT_DIR, f"{root}.{variant}{ext}")
+
+
+def rebuild_sessions(models, sess_options, providers=None, paths=None):
+    """用新的 SessionOptions 重建模型的 ONNX 会话（insightface 的 get_model 不透传 sess_options）
+
+    paths 指定各模型实际加载的文件（如量化变体），输入输出与原模型一致，model_file 保持不变。
+    """
+    import onnxruntime
+    for i, model in enumerate(models):
+        model_providers = providers or model.session.get_providers()
+        path = paths[i] if paths is not None else model.model_file
+        model.session = onnxruntime.InferenceSession(path, sess_options=sess_options, providers=model_providers)
+
+
+def warmup_model(model, input_size=None, runs=2):
+    """用全零输入运行模型会话，返回每次耗时（毫秒）；第一次包含内核初始化等一次性开销"""
+    session = model.session
+    feed = {}
+    for inp in session.get_inputs():
+        shape = list(inp.shape)
+        if input_size is not None and len(shape) == 4:
+            # 动态空间维度使用检测输入尺寸 (宽, 高)
+            shape[2] = shape[2] if isinstance(shape[2], int) else input_size[1]
+            shape[3] = shape[3] if isinstance(shape[3], int) else input_size[0]
+        shape = [dim if isinstance(dim, int) and dim > 0 else 1 for dim in shape]
+        feed[inp.name] = np.zeros(shape, dtype=ONNX_DTYPES.get(inp.type, np.float32))
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        session.run(None, feed)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def report_sessions(models, det_size=(640, 640)):
+    """启动报告：各模型实际使用的执行提供者和预热耗时，models 为 {名称: 模型}"""
+    rows = []
+    for name, model in models.items():
+        input_size = det_size if name == 'detection' else None
+        try:
+            first_ms, warm_ms = warmup_model(model, input_size)
+        except Exception as e:
+            log.warning("模型预热失败 %s: %s", name, e)
+            continue
+        provider = model.session.get_providers()[0]
+        rows.append({'model': name, 'provider': provider, 'first_ms': first_ms, 'warm_ms': warm_ms})
+    # 合并为一条日志，避免同一调用位置被限速
+    log.info("模型会话:\n%s", '\n'.join(f"  {r['model']:<16} {r['provider']:<28} 首次 {r['first_ms']:8.1f} ms  "
+                                         f"预热后 {r['warm_ms']:8.1f} ms" for r in rows))
+    return rows
@@ -0,0 +1,297 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from facex_log import get_logger
+from facex_stream import LatestQueue
+
+log = get_logger('source')
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+STREAM_PREFIXES = ('rtsp://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+_END = object()
+
+
+def synthetic_video(images, size, frames=None, zoom=0.15):
+    """由图像生成合成视频帧（生成器，frames 为 None 时无限循环）：每张图像等比放入画面，逐帧缓慢缩放和平移，
+    模拟镜头和人脸运动；没有图像时生成移动的色块"""
+    width, height = size
+    if not images:
+        rng = np.random.default_rng(0)
+        background = cv2.GaussianBlur((rng.random((height, width, 3)) * 255).astype(np.uint8), (0, 0), 8)
+        images = [background]
+    per_image = max((frames or 120) // len(images), 1)
+    i = 0
+    while frames is None or i < frames:
+        img = images[(i // per_image) % len(images)]
+        t = (i % per_image) / per_image
+        h, w = img.shape[:2]
+        scale = min(width / w, height / h) * (1 + zoom * t)
+        M = np.float32([[scale, 0, (width - w * scale) / 2 + 0.05 * width * np.sin(2 * np.pi * t)],
+                        [0, scale, (height - h * scale) / 2]])
+        yield cv2.warpAffine(img, M, size, borderMode=cv2.BORDER_REFLECT)
+        i += 1
+
+
+class FrameSource:
+    """帧来源：与 cv2.VideoCapture 相同的 read() / release() / isOpened() / get() 接口，可直接交给 StreamPipeline
+
+    子类实现 grab_frame()，返回 BGR 帧，结束时返回 None；loop 为 True 时到结尾后从头开始。
+    """
+
+    def __init__(self, fps=30.0, loop=False):
+        self.fps = fps
+        self.loop = loop
+        self.opened = True
+        self.size = (0, 0)
+
+    def grab_frame(self):
+        raise NotImplementedError
+
+    def rewind(self):
+        # 循环播放时回到开头，不支持时返回 False
+        return False
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        frame = self.grab_frame()
+        if frame is None and self.loop and self.rewind():
+            frame = self.grab_frame()
+        if frame is None:
+            return False, None
+        return True, frame
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        # 只提供常用属性，便于替换 VideoCapture
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        return 0.0
+
+    def release(self):
+        self.opened = False
+
+
+class CaptureSource(FrameSource):
+    """OpenCV 捕获：摄像头序号、视频文件或网络流（RTSP 等）
+
+    网络流读取失败时按 reconnect 秒间隔重连；摄像头按 resolution/fps 设置采集参数。
+    """
+
+    def __init__(self, target, resolution=None, fps=None, loop=False, reconnect=2.0):
+        self.target = target
+        self.is_camera = isinstance(target, int)
+        self.is_stream = isinstance(target, str) and target.lower().startswith(STREAM_PREFIXES)
+        self.resolution = resolution
+        self.requested_fps = fps
+        self.reconnect = reconnect if self.is_stream else 0
+        self.cap = None
+        self.open()
+        super().__init__(fps=self.cap.get(cv2.CAP_PROP_FPS) or fps or 30.0, loop=loop)
+        self.size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def open(self):
+        cap = cv2.VideoCapture(self.target, cv2.CAP_FFMPEG) if self.is_stream else cv2.VideoCapture(self.target)
+        if self.is_camera:
+            if self.resolution:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+            if self.requested_fps:
+                cap.set(cv2.CAP_PROP_FPS, self.requested_fps)
+        if not cap.isOpened():
+            raise IOError("无法打开摄像头" if self.is_camera else f"无法打开视频源: {self.target}")
+        self.cap = cap
+
+    def grab_frame(self):
+        ret, frame = self.cap.read()
+        if ret:
+            return frame
+        if self.reconnect and self.opened:
+            log.warning("视频流中断，%.0f 秒后重连: %s", self.reconnect, self.target)
+            time.sleep(self.reconnect)
+            try:
+                self.cap.release()
+                self.open()
+            except IOError as e:
+                log.warning("%s", e)
+        return None
+
+    def rewind(self):
+        if self.is_camera or self.is_stream:
+            return False
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    """图像目录：按文件名顺序逐张输出，默认循环"""
+
+    def __init__(self, path, fps=30.0, loop=True):
+        super().__init__(fps=fps, loop=loop)
+        self.paths = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                      if name.lower().endswith(IMAGE_EXTS)]
+        if not self.paths:
+            raise IOError(f"目录中没有可用的图像: {path}")
+        self.index = 0
+        first = cv2.imread(self.paths[0])
+        self.size = (first.shape[1], first.shape[0]) if first is not None else (0, 0)
+
+    def grab_frame(self):
+        while self.index < len(self.paths):
+            path = self.paths[self.index]
+            self.index += 1
+            img = cv2.imread(path)
+            if img is not None:
+                return img
+            log.warning("跳过无法读取的图像: %s", path)
+        return None
+
+    def rewind(self):
+        self.index = 0
+        return True
+
+
+class SyntheticSource(FrameSource):
+    """合成画面：由 image_dir 中的图像（不存在时为随机色块）生成缓慢缩放、平移的视频，适合无摄像头环境"""
+
+    def __init__(self, size=(640, 480), fps=30.0, image_dir='pictures', frames=None):
+        super().__init__(fps=fps, loop=False)
+        self.size = tuple(size)
+        images = []
+        if image_dir and os.path.isdir(image_dir):
+            images = [img for img in (cv2.imread(os.path.join(image_dir, name))
+                                      for name in sorted(os.listdir(image_dir))
+                                      if name.lower().endswith(IMAGE_EXTS)) if img is not None]
+        self.frames = synthetic_video(images, self.size, frames)
+
+    def grab_frame(self):
+        return next(self.frames, None)
+
+
+class ReadAheadSource(FrameSource):
+    """预读线程：在后台从 source 读帧放入缓冲区，read() 直接取出
+
+    realtime 为 False 时全速读取，缓冲区满则等待，不丢帧（文件、图像目录按解码速度供帧，用于吞吐测试）；
+    realtime 为 True 时按 fps 节奏产出帧、只保留最新一帧，与真实摄像头相同（用于复现实时负载）。
+    网络流总是按到达节奏读取并只保留最新帧，避免延迟累积。
+    """
+
+    def __init__(self, source, buffer_size=8, realtime=False):
+        super().__init__(fps=source.fps, loop=False)
+        self.source = source
+        self.size = source.size
+        self.realtime = realtime
+        self.is_stream = getattr(source, 'is_stream', False)
+        self.drop_old = realtime or self.is_stream
+        self.buffer = LatestQueue(1) if self.drop_old else queue.Queue(buffer_size)
+        self.ended = False
+        self.thread = threading.Thread(target=self.run, name="read-ahead", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        interval = 1.0 / self.fps if self.realtime and self.fps else 0
+        next_time = time.perf_counter()
+        while self.opened:
+            ret, frame = self.source.read()
+            if not ret:
+                if self.is_stream and self.source.isOpened():
+                    continue
+                break
+            if interval:
+                # 下一帧先解码再等待到预定时间；处理跟不上时从当前时刻重新计时，不补发积压的帧
+                next_time = max(next_time + interval, time.perf_counter())
+                time.sleep(max(next_time - time.perf_counter(), 0))
+            self.put(frame)
+        self.put(_END)
+
+    def put(self, item):
+        if self.drop_old:
+            self.buffer.put(item)
+            return
+        while self.opened:
+            try:
+                self.buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def next_item(self):
+        # LatestQueue 超时返回 None，queue.Queue 超时抛出 Empty
+        if self.drop_old:
+            return self.buffer.get(timeout=0.1)
+        try:
+            return self.buffer.get(timeout=0.1)
+        except queue.Empty:
+            return None
+
+    def grab_frame(self):
+        while self.opened and not self.ended:
+            item = self.next_item()
+            if item is _END:
+                self.ended = True
+            elif item is not None:
+                return item
+        return None
+
+    def release(self):
+        super().release()
+        if self.drop_old:
+            self.buffer.close()
+        self.thread.join(1.0)
+        self.source.release()
+
+
+def open_source(spec=None, resolution=(640, 480), fps=30.0, loop=None, realtime=None, buffer_size=None,
+                environ=None):
+    """按描述打开帧来源，未指定的参数从环境变量读取
+
+    spec（FACEX_SOURCE，默认 0）：
+      整数            摄像头序号
+      rtsp:// 等 URL  网络流
+      目录            图像目录
+      synthetic       合成画面（synthetic:1280x720 指定尺寸）
+      其他            视频文件
+    FACEX_SOURCE_LOOP=0/1      文件和图像目录结束后是否循环（图像目录默认循环，视频文件默认不循环）
+    FACEX_SOURCE_REALTIME=0/1  文件类来源是否按帧率节奏输出（默认 1，复现实时条件；0 为全速读取）
+    FACEX_SOURCE_BUFFER        预读缓冲区帧数（默认 8）
+    """
+    env = os.environ if environ is None else environ
+    spec = str(spec if spec is not None else env.get('FACEX_SOURCE', '0'))
+    if loop is None and 'FACEX_SOURCE_LOOP' in env:
+        loop = env['FACEX_SOURCE_LOOP'] == '1'
+    if realtime is None:
+        realtime = env.get('FACEX_SOURCE_REALTIME', '1') == '1'
+    buffer_size = buffer_size or int(env.get('FACEX_SOURCE_BUFFER', 8))
+
+    if spec.isdigit():
+        # 摄像头由驱动按自身帧率供帧，不需要预读
+        return CaptureSource(int(spec), resolution, fps)
+    if spec.lower().startswith('synthetic'):
+        size = tuple(int(v) for v in spec.split(':', 1)[1].lower().split('x')) if ':' in spec else resolution
+        source = SyntheticSource(size, fps)
+    elif spec.lower().startswith(STREAM_PREFIXES):
+        source = CaptureSource(spec)
+    elif os.path.isdir(spec):
+        source = ImageDirSource(spec, fps, loop=True if loop is None else loop)
+    elif os.path.exists(spec):
+        source = CaptureSource(spec, loop=bool(loop))
+    else:
+        raise IOError(f"无法打开视频源: {spec}")
+    log.info("视频源: %s %dx%d @ %.1f fps%s", spec, source.size[0], source.size[1], source.fps,
+             "（按帧率节奏）" if realtime else "（全速）")
+    return ReadAheadSource(source, buffer_size, realtime)
@@ -0,0 +1,74 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from facex_log import get_logger
+
+log = get_logger('startup')
+
+# 空白帧上的假想人脸 5 点（相对宽高），用于预热换脸路径
+WARMUP_KPS = np.array([[0.38, 0.40], [0.62, 0.40], [0.50, 0.52], [0.41, 0.64], [0.59, 0.64]], dtype=np.float32)
+
+
+class StartupTimer:
+    """冷启动耗时分解：记录各阶段的起止时间（相对进程内的计时起点），可跨线程记录"""
+
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def add(self, name, start, end=None):
+        end = time.perf_counter() if end is None else end
+        with self.lock:
+            self.phases.append((name, (start - self.origin) * 1000, (end - self.origin) * 1000))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start)
+
+    def report(self):
+        with self.lock:
+            phases = list(self.phases)
+        log.info("冷启动耗时:\n%s", '\n'.join(f"  {name:<10} {end - start:8.1f} ms  (完成于 {end:8.1f} ms)"
+                                             for name, start, end in phases))
+        return phases
+
+
+class BackgroundLoader(threading.Thread):
+    """在后台线程执行加载函数，GUI 线程轮询 done() 后再使用结果，窗口无需等待模型加载"""
+
+    def __init__(self, load_fn, name="loader"):
+        super().__init__(name=name, daemon=True)
+        self.load_fn = load_fn
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.load_fn()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+    def done(self):
+        return self.finished.is_set()
+
+
+def warm_up(analyzer, swapper, shape=(240, 320, 3)):
+    """在空白帧上跑一遍检测和换脸（对齐、推理、贴回），首个真实帧不再承担会话初始化开销"""
+    from insightface.app.common import Face
+    frame = np.zeros(shape, dtype=np.uint8)
+    analyzer.get(frame)
+    height, width = shape[:2]
+    target = Face(kps=WARMUP_KPS * [width, height], bbox=np.array([0, 0, width, height], dtype=np.float32))
+    source = Face(embedding=np.full(512, 1 / np.sqrt(512), dtype=np.float32))
+    swapper.get(frame, target, source, paste_back=True)
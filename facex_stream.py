@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import deque
+
+from facex_log import get_logger
+
+log = get_logger('stream')
+
+
+class FramePacket:
+    """在各阶段之间传递的帧数据"""
+
+    def __init__(self, seq, frame, timestamp=None):
+        self.seq = seq
+        self.frame = frame
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.output = None
+
+
+class LatestQueue:
+    """容量有限的帧队列，满时丢弃最旧的帧（latest-frame-wins）"""
+
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, maxsize)
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if self.closed:
+                return
+            while len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        # 阻塞等待新帧，超时或队列关闭时返回 None
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if self.items:
+                return self.items.popleft()
+            return None
+
+    def get_nowait(self):
+        with self.cond:
+            if self.items:
+                return self.items.popleft()
+            return None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        with self.cond:
+            return len(self.items)
+
+
+class Sink:
+    """在推理线程中直接调用的下游，fn 不能阻塞（例如只把帧放入录制队列）"""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.errors = 0
+
+    def put(self, packet):
+        try:
+            self.fn(packet)
+        except Exception as e:
+            self.errors += 1
+            log.warning("下游处理帧时出错: %s", e)
+
+    def close(self):
+        pass
+
+
+class StageThread(threading.Thread):
+    """流水线中的一个阶段线程"""
+
+    def __init__(self, name):
+        super().__init__(name=name, daemon=True)
+        self.running = False
+        self.count = 0
+        self.errors = 0
+
+    def stop(self):
+        self.running = False
+
+
+class CaptureThread(StageThread):
+    """采集线程：按摄像头速率读帧，推入有界队列"""
+
+    def __init__(self, cap, out_queue, name="capture", profiler=None):
+        super().__init__(name)
+        self.cap = cap
+        self.out_queue = out_queue
+        self.profiler = profiler
+
+    def run(self):
+        self.running = True
+        seq = 0
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if self.profiler is not None and ret:
+                # 包含等待摄像头出帧的时间
+                self.profiler.add('capture', (time.perf_counter() - start) * 1000)
+            if not ret:
+                self.errors += 1
+                time.sleep(0.01)
+                continue
+            seq += 1
+            self.count += 1
+            self.out_queue.put(FramePacket(seq, frame))
+
+
+class WorkerThread(StageThread):
+    """推理线程：从输入队列取最新帧，处理后分发给所有下游队列"""
+
+    def __init__(self, in_queue, out_queues, process_fn, name="worker"):
+        super().__init__(name)
+        self.in_queue = in_queue
+        self.out_queues = out_queues
+        self.process_fn = process_fn
+
+    def run(self):
+        self.running = True
+        while self.running:
+            packet = self.in_queue.get(timeout=0.1)
+            if packet is None:
+                continue
+            try:
+                packet.output = self.process_fn(packet.frame)
+            except Exception as e:
+                self.errors += 1
+                log.warning("处理帧时出错: %s", e)
+                continue
+            self.count += 1
+            for queue in self.out_queues:
+                queue.put(packet)
+
+
+class ConsumerThread(StageThread):
+    """消费线程：例如录制，独立于 GUI 线程运行"""
+
+    def __init__(self, in_queue, consume_fn, name="consumer"):
+        super().__init__(name)
+        self.in_queue = in_queue
+        self.consume_fn = consume_fn
+
+    def run(self):
+        self.running = True
+        while self.running:
+            packet = self.in_queue.get(timeout=0.1)
+            if packet is None:
+                continue
+            try:
+                self.consume_fn(packet)
+            except Exception as e:
+                self.errors += 1
+                log.warning("消费帧时出错: %s", e)
+                continue
+            self.count += 1
+
+
+class StreamPipeline:
+    """采集 → 有界队列 → 推理线程 → 显示/录制消费者
+
+    各阶段并行运行，队列满时只保留最新帧，吞吐量只受最慢阶段限制。
+    process_fn 带有状态时 num_workers 应保持为 1。传入 profiler 时记录采集耗时。
+    """
+
+    def __init__(self, cap, process_fn, num_workers=1, queue_size=1, profiler=None):
+        self.cap = cap
+        self.process_fn = process_fn
+        self.profiler = profiler
+        self.num_workers = max(1, num_workers)
+        self.queue_size = queue_size
+
+        self.capture_queue = LatestQueue(queue_size)
+        self.display_queue = LatestQueue(1)
+        self.consumer_queues = []
+        self.consumers = []
+        self.sinks = []
+        self.capture_thread = None
+        self.workers = []
+        self.last_seq = 0
+
+    def add_consumer(self, consume_fn, queue_size=None, name="consumer"):
+        # 需在 start 之前注册
+        queue = LatestQueue(queue_size or self.queue_size)
+        self.consumer_queues.append(queue)
+        self.consumers.append(ConsumerThread(queue, consume_fn, name=name))
+
+    def add_sink(self, fn):
+        # 需在 start 之前注册；每个处理结果都会交给 fn，不经过丢帧队列
+        self.sinks.append(Sink(fn))
+
+    def start(self):
+        out_queues = [self.display_queue] + self.consumer_queues + self.sinks
+        self.capture_thread = CaptureThread(self.cap, self.capture_queue, profiler=self.profiler)
+        self.workers = [WorkerThread(self.capture_queue, out_queues, self.process_fn, name=f"worker-{i}")
+                        for i in range(self.num_workers)]
+        for thread in [self.capture_thread] + self.workers + self.consumers:
+            thread.start()
+
+    def latest(self):
+        """非阻塞获取最新的处理结果，供 GUI 定时器调用；没有新帧时返回 None"""
+        packet = self.display_queue.get_nowait()
+        # 多个推理线程时可能乱序，丢弃比已显示帧更旧的结果
+        if packet is None or packet.seq <= self.last_seq:
+            return None
+        self.last_seq = packet.seq
+        return packet
+
+    def stop(self, timeout=1.0):
+        threads = [self.capture_thread] + self.workers + self.consumers
+        for thread in threads:
+            if thread is not None:
+                thread.stop()
+        for queue in [self.capture_queue, self.display_queue] + self.consumer_queues:
+            queue.close()
+        for thread in threads:
+            if thread is not None and thread.is_alive():
+                thread.join(timeout)
+
+    def stats(self):
+        return {
+            'captured': self.capture_thread.count if self.capture_thread else 0,
+            'processed': sum(w.count for w in self.workers),
+            'dropped': self.capture_queue.dropped,
+            'errors': sum(t.errors for t in self.workers + self.consumers + self.sinks),
+        }
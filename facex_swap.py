@@ -0,0 +1,172 @@
+import cv2
+import numpy as np
+
+from facex_log import get_logger
+
+log = get_logger('swap')
+
+
+class PasteBack:
+    """inswapper 结果贴回：遮罩生成和混合只在人脸区域内进行
+
+    遮罩步骤与 INSwapper.get 相同（逆仿射、阈值、腐蚀、高斯羽化），但只处理逆变换后 128x128 方块的包围盒
+    （外扩羽化半径），腐蚀/模糊核按人脸大小缓存，遮罩为 uint8，混合直接在 uint8 图像上写回。
+    """
+
+    def __init__(self, max_kernels=64):
+        self.max_kernels = max_kernels
+        self.erode_kernels = {}
+        self.blur_kernels = {}
+        self.white = {}
+
+    def erode_kernel(self, k):
+        kernel = self.erode_kernels.get(k)
+        if kernel is None:
+            if len(self.erode_kernels) >= self.max_kernels:
+                self.erode_kernels.clear()
+            kernel = self.erode_kernels[k] = np.ones((k, k), np.uint8)
+        return kernel
+
+    def blur_kernel(self, ksize):
+        # 与 GaussianBlur(sigma=0) 相同的一维核，用于可分离滤波
+        kernel = self.blur_kernels.get(ksize)
+        if kernel is None:
+            if len(self.blur_kernels) >= self.max_kernels:
+                self.blur_kernels.clear()
+            kernel = self.blur_kernels[ksize] = cv2.getGaussianKernel(ksize, 0, cv2.CV_32F)
+        return kernel
+
+    def white_square(self, size):
+        square = self.white.get(size)
+        if square is None:
+            square = self.white[size] = np.full((size, size), 255, dtype=np.uint8)
+        return square
+
+    @staticmethod
+    def roi(IM, size, shape):
+        """逆变换后方块的包围盒，外扩羽化半径的上界，裁剪到图像范围"""
+        h, w = shape[:2]
+        corners = np.array([[0, 0], [size, 0], [0, size], [size, size]], np.float32) @ IM[:, :2].T + IM[:, 2]
+        x0, y0 = np.floor(corners.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(corners.max(axis=0)).astype(int)
+        pad = max(int(np.sqrt(max(x1 - x0, 1) * max(y1 - y0, 1))) // 20, 5) + 2
+        x0, y0 = max(x0 - pad, 0), max(y0 - pad, 0)
+        x1, y1 = min(x1 + pad, w), min(y1 + pad, h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    def paste(self, img, bgr_fake, M):
+        """把 128x128 换脸结果按对齐矩阵 M 贴回 img（原地修改），返回 img"""
+        size = bgr_fake.shape[0]
+        IM = cv2.invertAffineTransform(M)
+        roi = self.roi(IM, size, img.shape)
+        if roi is None:
+            return img
+        x0, y0, x1, y1 = roi
+        IM[:, 2] -= (x0, y0)
+        dsize = (x1 - x0, y1 - y0)
+
+        fake = cv2.warpAffine(bgr_fake, IM, dsize, borderValue=0.0)
+        mask = cv2.warpAffine(self.white_square(size), IM, dsize, borderValue=0.0)
+        mask[mask > 20] = 255
+
+        # 与 np.where(mask == 255) 的行列跨度相同
+        _, _, mask_w, mask_h = cv2.boundingRect(cv2.compare(mask, 255, cv2.CMP_EQ))
+        if mask_w == 0:
+            return img
+        mask_size = int(np.sqrt((mask_h - 1) * (mask_w - 1)))
+        mask = cv2.erode(mask, self.erode_kernel(max(mask_size // 10, 10)), iterations=1)
+        kernel = self.blur_kernel(2 * max(mask_size // 20, 5) + 1)
+        mask = cv2.sepFilter2D(mask, -1, kernel, kernel)
+
+        # uint8 输入输出的逐像素加权混合，四舍五入（原实现为整帧浮点混合后截断）
+        region = img[y0:y1, x0:x1]
+        weight = mask.astype(np.float32) * (1 / 255)
+        region[:] = cv2.blendLinear(fake, region, weight, 1 - weight)
+        return img
+
+
+class BatchSwapper:
+    """inswapper 批量推理：一帧中所有目标人脸的 128x128 对齐图像合并为一次会话调用
+
+    包装 insightface 的 INSwapper，get() 与原接口一致；模型输入的 batch 维度固定为 1 时退回逐张推理。
+    insightface 发布的 inswapper_128.onnx 的 batch 维度就固定为 1：使用原模型时不会合并推理，每张人脸仍各调用一次会话，
+    只有导出为动态 batch 的模型才能一帧一次推理（runs 计数可用于确认）。
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.input_size = model.input_size
+        self.batchable = self.check_batch()
+        self.paster = PasteBack()
+        self.runs = 0  # 会话调用次数，用于确认每帧只推理一次
+
+    # rebuild_sessions 通过 session / model_file 重建会话，这里转发到被包装的模型
+    @property
+    def session(self):
+        return self.model.session
+
+    @session.setter
+    def session(self, value):
+        self.model.session = value
+        self.batchable = self.check_batch()
+
+    @property
+    def model_file(self):
+        return self.model.model_file
+
+    def check_batch(self):
+        # batch 维度为符号（动态）时才能一次送入多张人脸
+        dim = self.model.session.get_inputs()[0].shape[0]
+        return not isinstance(dim, int)
+
+    def latent(self, source_face):
+        latent = source_face.normed_embedding.reshape((1, -1))
+        latent = np.dot(latent, self.model.emap)
+        return latent / np.linalg.norm(latent)
+
+    def run(self, blob, latent):
+        self.runs += 1
+        model = self.model
+        return model.session.run(model.output_names, {model.input_names[0]: blob, model.input_names[1]: latent})[0]
+
+    def infer(self, crops, latents):
+        """对齐图像 + 源人脸特征 -> 换脸结果 (N, 128, 128, 3) BGR uint8"""
+        mean = self.model.input_mean
+        blob = cv2.dnn.blobFromImages(crops, 1.0 / self.model.input_std, self.input_size, (mean, mean, mean),
+                                      swapRB=True)
+        latent = np.concatenate(latents).astype(np.float32)
+
+        preds = None
+        if self.batchable or len(crops) == 1:
+            try:
+                preds = self.run(blob, latent)
+            except Exception as e:
+                log.warning("批量换脸推理失败，改为逐张推理: %s", e)
+                self.batchable = False
+        if preds is None:
+            preds = np.concatenate([self.run(blob[i:i + 1], latent[i:i + 1]) for i in range(len(crops))])
+
+        return np.clip(255 * preds.transpose((0, 2, 3, 1)), 0, 255).astype(np.uint8)[..., ::-1]
+
+    def swap_many(self, img, pairs, paste_back=True):
+        """pairs 为 [(目标人脸, 源人脸)]，所有人脸一次推理后依次贴回原图"""
+        if not pairs:
+            return img if paste_back else []
+        from insightface.utils import face_align
+        aligned = [face_align.norm_crop2(img, target.kps, self.input_size[0]) for target, _ in pairs]
+        crops = [crop for crop, _ in aligned]
+        fakes = self.infer(crops, [self.latent(source) for _, source in pairs])
+        if not paste_back:
+            return [(fake, M) for fake, (_, M) in zip(fakes, aligned)]
+
+        result = img.copy()
+        for fake, (_, M) in zip(fakes, aligned):
+            self.paster.paste(result, fake, M)
+        return result
+
+    def get(self, img, target_face, source_face, paste_back=True):
+        # 与 INSwapper.get 相同的单人脸接口
+        result = self.swap_many(img, [(target_face, source_face)], paste_back)
+        return result if paste_back else result[0]
@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+
+# 跟踪时随人脸一起变换的特征点字段
+LANDMARK_FIELDS = ('kps', 'landmark_2d_106', 'landmark_3d_68')
+
+
+class FaceTracker:
+    """关键帧检测 + 光流跟踪
+
+    关键帧上由检测器给出人脸，中间帧用金字塔 LK 光流跟踪人脸区域内的角点，
+    估计相似变换后更新 bbox 和特征点。运动越快关键帧间隔越短，画面稳定时逐步拉长间隔。
+    """
+
+    def __init__(self, min_interval=2, max_interval=15, slow_motion=0.01, fast_motion=0.05,
+                 max_corners=40, min_points=8, fb_thresh=1.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slow_motion = slow_motion  # 每帧位移 / 人脸宽度
+        self.fast_motion = fast_motion
+        self.max_corners = max_corners
+        self.min_points = min_points
+        self.fb_thresh = fb_thresh  # 前后向光流误差阈值（像素）
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.reset()
+
+    def reset(self):
+        self.face = None
+        self.prev_gray = None
+        self.points = None
+        self.interval = self.min_interval
+        self.since_keyframe = 0
+        self.motion = 0.0
+
+    def needs_detection(self):
+        return self.face is None or self.since_keyframe >= self.interval
+
+    @staticmethod
+    def to_gray(frame):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def init(self, frame, face):
+        """关键帧：用检测结果重新初始化跟踪点"""
+        gray = self.to_gray(frame)
+        h, w = gray.shape
+        x0, y0, x1, y1 = np.clip(np.asarray(face.bbox), 0, [w - 1, h - 1, w - 1, h - 1]).astype(int)
+
+        mask = np.zeros_like(gray)
+        mask[y0:y1 + 1, x0:x1 + 1] = 255
+        corners = cv2.goodFeaturesToTrack(gray, self.max_corners, 0.01, 5, mask=mask)
+        points = [np.asarray(face.kps, dtype=np.float32).reshape(-1, 2)]
+        if corners is not None:
+            points.append(corners.reshape(-1, 2))
+
+        self.face = face
+        self.prev_gray = gray
+        self.points = np.concatenate(points).reshape(-1, 1, 2)
+        self.since_keyframe = 0
+
+    def track(self, frame):
+        """中间帧：返回跟踪得到的人脸，跟踪失败时返回 None（需要重新检测）"""
+        if self.face is None:
+            return None
+        gray = self.to_gray(frame)
+
+        # 前向 + 后向光流，剔除不可靠的点
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **self.lk_params)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, new_points, None,
+                                                               **self.lk_params)
+        fb_error = np.linalg.norm((self.points - back_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.fb_thresh)
+        if good.sum() < self.min_points:
+            self.face = None
+            return None
+
+        old = self.points[good].reshape(-1, 2)
+        new = new_points[good].reshape(-1, 2)
+        matrix, inliers = cv2.estimateAffinePartial2D(old, new, method=cv2.RANSAC, ransacReprojThreshold=3.0)
+        if matrix is None or inliers is None or inliers.sum() < self.min_points:
+            self.face = None
+            return None
+
+        face = self.transform_face(self.face, matrix)
+        self.adapt_interval(np.median(np.linalg.norm(new - old, axis=1)), face)
+
+        self.face = face
+        self.prev_gray = gray
+        self.points = new.reshape(-1, 1, 2)
+        self.since_keyframe += 1
+        return face
+
+    @staticmethod
+    def transform_face(face, matrix):
+        # 复制人脸并对 bbox 和各组特征点应用相似变换
+        from insightface.app.common import Face
+        tracked = Face(dict(face))
+        for field in LANDMARK_FIELDS:
+            points = face.get(field)
+            if points is None:
+                continue
+            points = np.array(points, dtype=np.float32)
+            points[:, :2] = points[:, :2] @ matrix[:, :2].T + matrix[:, 2]
+            tracked[field] = points
+
+        x0, y0, x1, y1 = face.bbox[:4]
+        corners = np.array([[x0, y0], [x1, y0], [x0, y1], [x1, y1]], dtype=np.float32)
+        corners = corners @ matrix[:, :2].T + matrix[:, 2]
+        bbox = np.array(face.bbox, dtype=np.float32)
+        bbox[:4] = [corners[:, 0].min(), corners[:, 1].min(), corners[:, 0].max(), corners[:, 1].max()]
+        tracked['bbox'] = bbox
+        return tracked
+
+    def adapt_interval(self, displacement, face):
+        # 按相对人脸大小的运动幅度调整关键帧间隔
+        face_width = max(1.0, float(face.bbox[2] - face.bbox[0]))
+        self.motion = displacement / face_width
+        if self.motion > self.fast_motion:
+            self.interval = max(self.min_interval, self.interval // 2)
+        elif self.motion < self.slow_motion:
+            self.interval = min(self.max_interval, self.interval + 1)